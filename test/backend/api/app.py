@@ -6,10 +6,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from ..core.config import settings
 from ..database.models import Base
-from ..database.database import engine
+from ..database.database import engine, dispose_async_engine
 from .routes import stories, analytics, tasks
 
-# Create database tables
+# Create database tables (columns and indexes added later come from `main.py create-tables`)
 Base.metadata.create_all(bind=engine)
 
 # Initialize FastAPI app
@@ -34,6 +34,13 @@ app.include_router(analytics.router, prefix="/api/v1", tags=["analytics"])
 app.include_router(tasks.router, prefix="/api/v1", tags=["tasks"])
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled connections held by shared services."""
+    await stories.hn_service.aclose()
+    await dispose_async_engine()
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information."""
@@ -3,57 +3,150 @@ Analytics-related API routes.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import timedelta
+from typing import List, Literal, Optional
 
-from ...database.database import get_db
-from ...database import crud
-from ...schemas import Analytics, Domain, DashboardResponse
+from ...database.database import get_db, get_async_db
+from ...database import crud, async_crud
+from ...schemas import (
+    Analytics, Domain, DashboardResponse, TrendCount, TrendingTerm, DailyRollup,
+    AIKeywordCreate, AIKeywordUpdate
+)
 from ...services.analytics_service import AnalyticsService
-from ...database.crud import get_ai_keywords
+from ...services.cache_service import CacheService
 
 router = APIRouter()
 
 # Initialize services
 analytics_service = AnalyticsService()
+cache_service = CacheService()
+
+# Trend windows in hours and the bucket kind behind each trend path
+TREND_WINDOWS = {"1h": 1, "24h": 24, "7d": 168}
+TREND_KINDS = {"keywords": "keyword", "domains": "domain"}
 
 
 @router.get("/analytics", response_model=List[Analytics])
 async def get_analytics(
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get top analytics by frequency."""
-    return crud.get_analytics(db, limit=limit)
+    cache_key = await cache_service.key(f"analytics:{limit}")
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    analytics = [Analytics.model_validate(a).model_dump(mode="json") for a in await async_crud.get_analytics(db, limit=limit)]
+    await cache_service.set(cache_key, analytics)
+    return analytics
 
 
 @router.get("/domains", response_model=List[Domain])
 async def get_domains(
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get top domains by frequency."""
-    return crud.get_domains(db, limit=limit)
+    cache_key = await cache_service.key(f"domains:{limit}")
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    domains = [Domain.model_validate(d).model_dump(mode="json") for d in await async_crud.get_domains(db, limit=limit)]
+    await cache_service.set(cache_key, domains)
+    return domains
+
+
+@router.get("/trends/{kind}", response_model=List[TrendCount])
+async def get_trends(
+    kind: Literal["keywords", "domains"],
+    window: Literal["1h", "24h", "7d"] = "24h",
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the most mentioned keywords or domains over a recent window."""
+    cache_key = await cache_service.key(f"trends:{kind}:{window}:{limit}")
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    since, until, _ = analytics_service.trend_windows(TREND_WINDOWS[window])
+    rows = await async_crud.get_trend_counts(db, TREND_KINDS[kind], since, limit=limit, until=until)
+    trends = [{"term": term, "count": count} for term, count in rows]
+    await cache_service.set(cache_key, trends)
+    return trends
+
+
+@router.get("/trends/{kind}/trending", response_model=List[TrendingTerm])
+async def get_trending(
+    kind: Literal["keywords", "domains"],
+    window: Literal["1h", "24h", "7d"] = "24h",
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get keywords or domains ranked by how unusual their recent volume is."""
+    cache_key = await cache_service.key(f"trending:{kind}:{window}:{limit}")
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    hours = TREND_WINDOWS[window]
+    since, until, baseline_since = analytics_service.trend_windows(hours)
+    rows = await async_crud.get_trending_rows(db, TREND_KINDS[kind], since, baseline_since, until)
+    trending = analytics_service.rank_trending(rows, hours, limit=limit)
+    await cache_service.set(cache_key, trending)
+    return trending
+
+
+@router.get("/rollups/{kind}", response_model=List[DailyRollup])
+async def get_daily_rollups(
+    kind: Literal["keywords", "domains"],
+    days: int = Query(30, ge=1, le=365),
+    term: Optional[str] = Query(None, description="Only this keyword or domain"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get daily story counts, average score and comment totals per keyword or domain."""
+    cache_key = await cache_service.key(f"rollups:{kind}:{days}:{term}:{limit}")
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Rollup days are UTC days, so count back from the database clock
+    since = (await async_crud.get_db_now(db)).date() - timedelta(days=days - 1)
+    rows = await async_crud.get_daily_rollups(db, TREND_KINDS[kind], since, term=term, limit=limit)
+    rollups = [DailyRollup(**row).model_dump(mode="json") for row in rows]
+    await cache_service.set(cache_key, rollups)
+    return rollups
 
 
 @router.get("/dashboard", response_model=DashboardResponse)
-async def get_dashboard(db: Session = Depends(get_db)):
+async def get_dashboard(db: AsyncSession = Depends(get_async_db)):
     """Get dashboard data including stories, analytics, and domains."""
+    cache_key = await cache_service.key("dashboard")
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        return cached
+    
     # Get recent stories
-    stories = crud.get_stories(db, skip=0, limit=10)
+    stories = await async_crud.get_stories(db, skip=0, limit=10)
     
     # Get top analytics
-    analytics = crud.get_analytics(db, limit=10)
+    analytics = await async_crud.get_analytics(db, limit=10)
     
     # Get top domains
-    domains = crud.get_domains(db, limit=10)
+    domains = await async_crud.get_domains(db, limit=10)
     
     # Get counts
-    total_stories = crud.get_stories_count(db)
-    total_keywords = crud.get_analytics_count(db)
-    total_domains = crud.get_domains_count(db)
+    total_stories = await async_crud.get_stories_count(db)
+    total_keywords = await async_crud.get_analytics_count(db)
+    total_domains = await async_crud.get_domains_count(db)
     
-    return DashboardResponse(
+    response = DashboardResponse(
         stories=stories,
         analytics=analytics,
         domains=domains,
@@ -61,16 +154,27 @@ async def get_dashboard(db: Session = Depends(get_db)):
         total_keywords=total_keywords,
         total_domains=total_domains
     )
+    await cache_service.set(cache_key, response.model_dump(mode="json"))
+    return response
 
 
 @router.post("/process-story/{story_id}")
-async def process_story(story_id: int, db: Session = Depends(get_db)):
+def process_story(story_id: int, db: Session = Depends(get_db)):
     """Manually process a story for analytics."""
     story = crud.get_story(db, story_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
+    if story.type == 'job':
+        raise HTTPException(status_code=400, detail="Job postings are not analyzed")
     
     result = analytics_service.process_story(db, story)
+    if result is None:
+        return {
+            "message": "Story was already processed",
+            "story_id": story_id,
+            "already_analyzed": True
+        }
+    cache_service.invalidate()
     
     return {
         "message": "Story processed successfully",
@@ -81,7 +185,30 @@ async def process_story(story_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/ai-keywords")
-def list_ai_keywords(db: Session = Depends(get_db)):
+async def list_ai_keywords(db: AsyncSession = Depends(get_async_db)):
     """Get all AI keywords and their status."""
-    keywords = get_ai_keywords(db)
-    return [{"id": k.id, "keyword": k.keyword, "status": k.status} for k in keywords] 
\ No newline at end of file
+    keywords = await async_crud.get_ai_keywords(db)
+    return [{"id": k.id, "keyword": k.keyword, "status": k.status} for k in keywords]
+
+
+@router.post("/ai-keywords", status_code=201)
+def add_ai_keyword(payload: AIKeywordCreate, db: Session = Depends(get_db)):
+    """Start tracking a keyword; workers pick it up without a restart."""
+    keyword = payload.keyword
+    try:
+        ai_keyword = crud.create_ai_keyword(db, keyword, payload.status)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Keyword '{keyword}' already exists")
+    cache_service.invalidate()
+    return {"id": ai_keyword.id, "keyword": ai_keyword.keyword, "status": ai_keyword.status}
+
+
+@router.patch("/ai-keywords/{keyword_id}")
+def update_ai_keyword(keyword_id: int, payload: AIKeywordUpdate, db: Session = Depends(get_db)):
+    """Enable or disable a tracked keyword; workers pick it up without a restart."""
+    ai_keyword = crud.set_ai_keyword_status(db, keyword_id, payload.status)
+    if not ai_keyword:
+        raise HTTPException(status_code=404, detail="Keyword not found")
+    
+    cache_service.invalidate()
+    return {"id": ai_keyword.id, "keyword": ai_keyword.keyword, "status": ai_keyword.status} 
\ No newline at end of file
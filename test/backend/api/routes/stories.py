@@ -3,20 +3,27 @@ Story-related API routes.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from ...database.database import get_db
-from ...database import crud
-from ...schemas import StoryListResponse, Story
+from ...database.database import get_db, get_async_db
+from ...database import crud, async_crud
+from ...schemas import StoryListResponse, Story, StorySnapshot, CommentKeyword
 from ...services.hn_service import HackerNewsService
 from ...services.redis_service import RedisService
+from ...services.analytics_service import AnalyticsService
+from ...services.cache_service import CacheService
 
 router = APIRouter()
 
 # Initialize services
 hn_service = HackerNewsService()
 redis_service = RedisService()
+analytics_service = AnalyticsService()
+cache_service = CacheService()
 
 
 @router.post("/fetch-stories", response_model=dict)
@@ -26,17 +33,15 @@ async def fetch_stories(db: Session = Depends(get_db)):
         # Fetch stories from HN API
         hn_stories = await hn_service.get_top_stories_details()
         
-        new_stories = 0
-        for hn_story in hn_stories:
-            story_data = hn_service.extract_story_data(hn_story)
-            
-            # Check if story already exists
-            existing_story = crud.get_story(db, story_data['id'])
-            if not existing_story:
-                # Create new story
-                story = crud.get_or_create_story(db, story_data)
-                new_stories += 1
-                
+        stories_data = [hn_service.extract_story_data(hn_story) for hn_story in hn_stories]
+        
+        # Insert new stories and refresh scores of known ones in one statement
+        new_ids = await run_in_threadpool(crud.bulk_upsert_stories, db, stories_data, update_existing=True)
+        new_stories = len(new_ids)
+        await run_in_threadpool(cache_service.invalidate)
+        
+        for story_data in stories_data:
+            if story_data['id'] in new_ids:
                 # Publish event to Redis with serializable data
                 serializable_data = {
                     'id': story_data['id'],
@@ -47,7 +52,7 @@ async def fetch_stories(db: Session = Depends(get_db)):
                     'descendants': story_data['descendants'],
                     'author': story_data['author']
                 }
-                redis_service.publish_story_event(story.id, serializable_data)
+                redis_service.publish_story_event(story_data['id'], serializable_data)
         
         return {
             "message": f"Successfully processed {len(hn_stories)} stories",
@@ -65,24 +70,67 @@ async def get_stories(
     limit: int = Query(100, ge=1, le=1000),
     keyword: Optional[str] = None,
     domain: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor; replaces skip"),
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get stories with optional filtering."""
-    stories = crud.get_stories(db, skip=skip, limit=limit, keyword=keyword, domain=domain)
-    total = crud.get_stories_count(db)
+    # Tracked keywords come from the registry, which may need a version check
+    tracked_keywords = await db.run_sync(analytics_service.keywords) if keyword else None
+    try:
+        stories = await async_crud.get_stories(
+            db, skip=skip, limit=limit, keyword=keyword, domain=domain, cursor=cursor,
+            tracked_keywords=tracked_keywords
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total = await async_crud.get_stories_count(db) if include_total else None
     
     return StoryListResponse(
         stories=stories,
         total=total,
         page=skip // limit + 1,
-        per_page=limit
+        per_page=limit,
+        next_cursor=crud.encode_cursor(stories[-1]) if len(stories) == limit else None
     )
 
 
 @router.get("/stories/{story_id}", response_model=Story)
-async def get_story(story_id: int, db: Session = Depends(get_db)):
+async def get_story(story_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific story by ID."""
-    story = crud.get_story(db, story_id)
+    story = await async_crud.get_story(db, story_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
-    return story 
\ No newline at end of file
+    return story
+
+
+@router.get("/stories/{story_id}/trajectory", response_model=List[StorySnapshot])
+async def get_story_trajectory(
+    story_id: int,
+    since: Optional[datetime] = Query(None, description="Only snapshots from this time on"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get how a story's score and comment count changed over time."""
+    snapshots = await async_crud.get_story_trajectory(db, story_id, since)
+    if not snapshots and not await async_crud.get_story(db, story_id):
+        raise HTTPException(status_code=404, detail="Story not found")
+    return snapshots
+
+
+@router.get("/stories/{story_id}/comment-keywords", response_model=List[CommentKeyword])
+async def get_story_comment_keywords(story_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get keyword mentions in a story's crawled comments."""
+    keywords = await async_crud.get_story_comment_keywords(db, story_id)
+    if not keywords and not await async_crud.get_story(db, story_id):
+        raise HTTPException(status_code=404, detail="Story not found")
+    return keywords
+
+
+@router.get("/feeds/{feed}", response_model=List[Story])
+async def get_feed_stories(
+    feed: Literal["top", "new", "best", "ask", "show", "job"],
+    limit: int = Query(30, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the stored stories listed on an HN feed as of the last fetch, in rank order."""
+    return await async_crud.get_feed_stories(db, feed, limit) 
\ No newline at end of file
@@ -3,7 +3,13 @@ Task-related API routes.
 """
 
 from fastapi import APIRouter
-from ...tasks.story_tasks import fetch_and_process_stories, update_analytics_summary
+from ...tasks.story_tasks import (
+    crawl_story_comments,
+    fetch_and_process_stories,
+    fetch_incremental_stories,
+    refresh_story_scores,
+    update_analytics_summary,
+)
 from ...core.celery_app import celery_app
 
 router = APIRouter()
@@ -16,6 +22,27 @@ def trigger_fetch_stories():
     return {"task_id": task.id, "status": "started"}
 
 
+@router.post("/tasks/fetch-incremental/")
+def trigger_fetch_incremental():
+    """Trigger background task to fetch only new and updated items."""
+    task = fetch_incremental_stories.delay()
+    return {"task_id": task.id, "status": "started"}
+
+
+@router.post("/tasks/refresh-scores/")
+def trigger_refresh_scores():
+    """Trigger background task to re-poll scores and comment counts of active stories."""
+    task = refresh_story_scores.delay()
+    return {"task_id": task.id, "status": "started"}
+
+
+@router.post("/tasks/crawl-comments/{story_id}")
+def trigger_crawl_comments(story_id: int):
+    """Trigger background task to crawl a story's comments for keyword mentions."""
+    task = crawl_story_comments.delay(story_id)
+    return {"task_id": task.id, "status": "started"}
+
+
 @router.post("/tasks/update-analytics/")
 def trigger_update_analytics():
     """Trigger background task to update analytics summary."""
@@ -23,6 +23,18 @@ celery_app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
+# Periodic tasks, run by `python main.py celery-beat`
+celery_app.conf.beat_schedule = {
+    "refresh-story-scores": {
+        "task": "backend.tasks.story_tasks.refresh_story_scores",
+        "schedule": settings.REFRESH_MIN_INTERVAL_SECONDS,
+    },
+    "update-analytics-summary": {
+        "task": "backend.tasks.story_tasks.update_analytics_summary",
+        "schedule": settings.ANALYTICS_SUMMARY_INTERVAL_SECONDS,
+    },
+}
+
 # Optional: Configure task routes
 celery_app.conf.task_routes = {
     "backend.tasks.story_tasks.*": {"queue": "celery"},
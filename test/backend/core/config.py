@@ -8,19 +8,87 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "postgresql://ashishkapoor@localhost:5432/hn_analytics"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_TRANSPORT: str = "pubsub"  # "pubsub" or "streams"
+    REDIS_STREAM_NAME: str = "stories"
+    REDIS_STREAM_MAXLEN: int = 100000  # Approximate cap on retained entries
+    REDIS_CONSUMER_GROUP: str = "background-processor"
+    REDIS_CONSUMER_NAME: Optional[str] = None  # Defaults to hostname-pid
+    REDIS_STREAM_BATCH_SIZE: int = 100  # Entries read per XREADGROUP call
+    REDIS_STREAM_BLOCK_MS: int = 5000
+    REDIS_STREAM_CLAIM_IDLE_MS: int = 60000  # Reclaim entries pending longer than this
     
     # Hacker News API
     HN_API_BASE_URL: str = "https://hacker-news.firebaseio.com/v0"
     HN_TOP_STORIES_LIMIT: int = 50
+    HN_FEEDS: list[str] = ["top", "new", "best", "ask", "show"]  # Feeds read by fetch_and_process_stories (add "job" for job posts)
+    HN_FEED_LIMIT: int = 50  # IDs taken from each feed other than top
+    HN_MAX_CONCURRENCY: int = 20  # Max in-flight item requests
+    HN_MAX_CONNECTIONS: int = 20
+    HN_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HN_REQUEST_TIMEOUT: float = 10.0
+    HN_HTTP2: bool = False  # Requires the optional `h2` package
+    HN_INCREMENTAL_MAX_ITEMS: int = 1000  # New item IDs scanned per incremental run
+    
+    # Ingestion
+    INGEST_BATCH_SIZE: int = 100  # Stories persisted per transaction
+    
+    # Comment crawling
+    COMMENT_MAX_DEPTH: int = 10  # Reply levels followed below a story
+    COMMENT_MAX_PER_DEPTH: int = 1000  # Items fetched per level
+    COMMENT_MAX_COMMENTS: int = 2000  # Comments crawled per story
+    COMMENT_BATCH_SIZE: int = 200  # Comments persisted per transaction
+    
+    # Score/comment refresh of active stories
+    REFRESH_MAX_AGE_HOURS: int = 48  # Older stories are only refreshed while on the front page
+    REFRESH_MIN_INTERVAL_SECONDS: int = 300  # Interval for brand-new and front-page stories
+    REFRESH_INTERVAL_DOUBLING_HOURS: float = 8.0  # The interval doubles every N hours of story age
+    REFRESH_MAX_STORIES: int = 500  # Stories re-polled per run, most overdue first
+    
+    # Daily rollups, trend bucket pruning and score history downsampling (update_analytics_summary)
+    ANALYTICS_SUMMARY_INTERVAL_SECONDS: int = 3600  # How often celery-beat runs the summary task
+    SNAPSHOT_FULL_RESOLUTION_HOURS: int = 24  # Every change is kept this long
+    SNAPSHOT_HOURLY_DAYS: int = 7  # ... then the last one per hour, then the last one per day
+    
+    # Response cache
+    CACHE_ENABLED: bool = True
+    CACHE_TTL_SECONDS: int = 300  # Redis tier
+    CACHE_LOCAL_TTL_SECONDS: float = 2.0  # In-process tier and version check interval
+    CACHE_SOCKET_TIMEOUT_SECONDS: float = 0.25  # Redis connect/read timeout before falling through to the DB
+    
+    # Trending (hourly keyword/domain buckets)
+    TREND_BASELINE_HOURS: int = 168  # History a window is compared against when ranking
+    TREND_RETENTION_DAYS: int = 30  # Older buckets are pruned
+    
+    # Daily rollups
+    ROLLUP_LAG_SECONDS: int = 300  # Skip stories stored more recently than this (open transactions)
+    
+    # Full analytics rebuild (main.py rebuild-analytics)
+    REBUILD_BATCH_SIZE: int = 5000  # Stories per streamed batch
+    REBUILD_WORKERS: int = 0  # Keyword matching processes (0/1 = in-process)
+    
+    # Historical backfill (main.py backfill)
+    BACKFILL_CHUNK_SIZE: int = 1000  # Item IDs fetched and checkpointed together
+    BACKFILL_SHARDS: int = 4  # ID ranges walked concurrently (one Celery task each with --celery)
+    BACKFILL_TASK_CHUNKS: int = 20  # Chunks a Celery backfill task handles before re-queueing itself
+    BACKFILL_MAX_RETRIES: int = 8  # Retries (with exponential backoff) of a failed Celery backfill task
+    
+    # Background processor micro-batching
+    PROCESSOR_BATCH_SIZE: int = 100  # Flush after this many events (1 = per-event processing)
+    PROCESSOR_FLUSH_INTERVAL_MS: int = 500  # ... or this long after the first buffered event
     
     # Application
     APP_NAME: str = "Hacker News Analytics Dashboard"
     DEBUG: bool = False
     
-    # AI Keywords for detection
+    # AI Keywords for detection (defaults; the ai_keywords table takes over once populated)
+    KEYWORD_REFRESH_SECONDS: float = 30.0  # How often workers check the keyword table for changes
     AI_KEYWORDS: list[str] = [
         "ChatGPT", "Claude", "Gemini", "OpenAI", "Anthropic", "Google AI",
         "GPT-4", "GPT-3", "LLM", "Large Language Model", "AI", "Artificial Intelligence",
@@ -37,4 +105,4 @@ class Settings(BaseSettings):
 settings = Settings() 
 
 def get_ai_keywords_from_config() -> list[str]:
-    return Settings().AI_KEYWORDS 
\ No newline at end of file
+    return list(settings.AI_KEYWORDS) 
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Shared helpers used by services and the database layer.
+"""
+
+import html
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import urlparse
+
+
+def extract_domain(url: Optional[str]) -> str:
+    """Extract the normalized domain (lowercase, no www.) from a URL."""
+    if not url:
+        return "unknown"
+    
+    try:
+        parsed = urlparse(url)
+        domain = parsed.netloc.lower()
+        # Remove www. prefix if present
+        if domain.startswith('www.'):
+            domain = domain[4:]
+        return domain or "unknown"
+    except ValueError:
+        return "unknown"
+
+
+def normalize_domain(domain: str) -> str:
+    """Normalize a user-supplied domain or URL for exact matching."""
+    domain = domain.strip().lower()
+    if "://" in domain:
+        return extract_domain(domain)
+    domain = domain.split("/", 1)[0]
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+_TAG = re.compile(r"<[^>]+>")
+
+
+def html_to_text(value: Optional[str]) -> str:
+    """Turn HN's HTML item text into plain text for keyword matching."""
+    if not value:
+        return ""
+    return html.unescape(_TAG.sub(" ", value))
+
+
+def utcnow() -> datetime:
+    """Current time as a naive UTC datetime, the clock every stored timestamp uses."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def from_timestamp(value: float) -> datetime:
+    """Convert a Unix timestamp (e.g. an HN item's ``time``) to a naive UTC datetime."""
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+def hour_bucket(value: datetime) -> datetime:
+    """Truncate a timestamp to the start of its hour."""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def window_start(hours: int, now: Optional[datetime] = None) -> datetime:
+    """First hour bucket of a window covering the last ``hours`` complete hours.
+    
+    The window ends where the current, still partial hour starts.
+    """
+    return hour_bucket(now or utcnow()) - timedelta(hours=hours) 
\ No newline at end of file
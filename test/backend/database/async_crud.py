@@ -0,0 +1,135 @@
+"""
+Async read paths used by the API routes.
+"""
+
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime
+from typing import List, Optional, Set, Tuple
+from . import crud, models
+from .crud import stories_statement
+
+
+async def get_db_now(db: AsyncSession) -> datetime:
+    """Current database time as a naive UTC datetime."""
+    return crud.db_now_value(await db.scalar(crud.db_now_statement(db.get_bind().dialect.name)))
+
+
+async def get_story(db: AsyncSession, story_id: int) -> Optional[models.Story]:
+    """Get a story by ID."""
+    return await db.get(models.Story, story_id)
+
+
+async def get_stories(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    keyword: Optional[str] = None,
+    domain: Optional[str] = None,
+    cursor: Optional[str] = None,
+    tracked_keywords: Optional[Set[str]] = None
+) -> List[models.Story]:
+    """Get stories with optional filtering."""
+    statement = stories_statement(skip, limit, keyword, domain, cursor, tracked_keywords)
+    result = await db.execute(statement)
+    return result.scalars().all()
+
+
+async def get_story_trajectory(
+    db: AsyncSession,
+    story_id: int,
+    since: Optional[datetime] = None
+) -> List[models.StorySnapshot]:
+    """Get a story's score/comment snapshots in time order."""
+    result = await db.execute(crud.story_trajectory_statement(story_id, since))
+    return result.scalars().all()
+
+
+async def get_feed_stories(db: AsyncSession, feed: str, limit: int = 30) -> List[models.Story]:
+    """Get the stories currently listed on ``feed`` in rank order."""
+    result = await db.execute(crud.feed_stories_statement(feed, limit))
+    return result.scalars().all()
+
+
+async def get_story_comment_keywords(db: AsyncSession, story_id: int) -> List[models.StoryCommentKeyword]:
+    """Get a story's comment keyword counts."""
+    result = await db.execute(crud.story_comment_keywords_statement(story_id))
+    return result.scalars().all()
+
+
+async def get_analytics(db: AsyncSession, limit: int = 10) -> List[models.Analytics]:
+    """Get top analytics by frequency."""
+    result = await db.execute(select(models.Analytics).order_by(desc(models.Analytics.count)).limit(limit))
+    return result.scalars().all()
+
+
+async def get_domains(db: AsyncSession, limit: int = 10) -> List[models.Domain]:
+    """Get top domains by frequency."""
+    result = await db.execute(select(models.Domain).order_by(desc(models.Domain.count)).limit(limit))
+    return result.scalars().all()
+
+
+async def get_trend_counts(
+    db: AsyncSession,
+    kind: str,
+    since: datetime,
+    limit: int = 10,
+    until: Optional[datetime] = None
+) -> List[Tuple[str, int]]:
+    """Get the top terms of one kind between two hours."""
+    result = await db.execute(crud.trend_counts_statement(kind, since, limit, until))
+    return [tuple(row) for row in result]
+
+
+async def get_trending_rows(
+    db: AsyncSession,
+    kind: str,
+    since: datetime,
+    baseline_since: datetime,
+    until: Optional[datetime] = None
+) -> List[Tuple[str, int, int]]:
+    """Get (term, window count, baseline count) rows for trending ranking."""
+    result = await db.execute(crud.trending_statement(kind, since, baseline_since, until))
+    return [tuple(row) for row in result]
+
+
+async def get_daily_rollups(
+    db: AsyncSession,
+    kind: str,
+    since: date,
+    term: Optional[str] = None,
+    limit: int = 100
+) -> List[dict]:
+    """Get daily rollup rows of one kind from ``since``."""
+    result = await db.execute(crud.daily_rollups_statement(kind, since, term, limit))
+    return [dict(row._mapping) for row in result]
+
+
+async def get_table_count(db: AsyncSession, name: str, exact: bool = False) -> int:
+    """Get a maintained row count, counting the table exactly if asked or unseeded."""
+    if not exact:
+        value = await db.scalar(crud.table_count_statement(name))
+        if value is not None:
+            return value
+    return await db.scalar(crud.exact_count_statement(name))
+
+
+async def get_stories_count(db: AsyncSession, exact: bool = False) -> int:
+    """Get total number of stories."""
+    return await get_table_count(db, 'stories', exact)
+
+
+async def get_analytics_count(db: AsyncSession, exact: bool = False) -> int:
+    """Get total number of analytics entries."""
+    return await get_table_count(db, 'analytics', exact)
+
+
+async def get_domains_count(db: AsyncSession, exact: bool = False) -> int:
+    """Get total number of domains."""
+    return await get_table_count(db, 'domains', exact)
+
+
+async def get_ai_keywords(db: AsyncSession) -> List[models.AIKeyword]:
+    """Get all AI keywords."""
+    result = await db.execute(select(models.AIKeyword))
+    return result.scalars().all() 
\ No newline at end of file
@@ -1,8 +1,76 @@
+import base64
+import binascii
+import json
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
+from sqlalchemy import (
+    Column, Date, Float, Integer, MetaData, Select, String, Table, bindparam, case, cast, delete,
+    desc, false, func, literal, literal_column, or_, select, tuple_, update
+)
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import date, datetime, timedelta, timezone
 from . import models
 from .. import schemas
+from ..core.utils import extract_domain, from_timestamp, normalize_domain
+
+# Rows per INSERT statement (keeps bind parameters well below driver limits)
+UPSERT_CHUNK_SIZE = 1000
+
+# Daily rollup model and its term column per kind
+ROLLUP_MODELS = {
+    'keyword': (models.KeywordDailyRollup, models.KeywordDailyRollup.keyword),
+    'domain': (models.DomainDailyRollup, models.DomainDailyRollup.domain),
+}
+
+# Tables whose row counts are maintained in ``table_counts``
+COUNTED_MODELS = {
+    'stories': models.Story,
+    'analytics': models.Analytics,
+    'domains': models.Domain,
+}
+
+# Job postings are stored for the job feed listing but kept out of all analytics
+NOT_JOB = or_(models.Story.type.is_(None), models.Story.type != "job")
+
+# PostgreSQL advisory lock key fencing story and analytics writers off a rebuild
+ANALYTICS_LOCK_KEY = 0x686e6131
+
+
+def lock_analytics(db: Session, exclusive: bool = False) -> None:
+    """Hold the analytics lock until the caller's transaction ends.
+    
+    Writers of stories and their analytics take it shared before their first
+    write; a rebuild takes it exclusively, so nothing is stored or counted
+    while it runs. SQLite allows one writer at a time, so there a rebuild only
+    has to start its write transaction up front.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        lock = func.pg_advisory_xact_lock if exclusive else func.pg_advisory_xact_lock_shared
+        db.execute(select(lock(ANALYTICS_LOCK_KEY)))
+    elif exclusive:
+        db.execute(update(models.TableCount).where(false()).values(count=models.TableCount.count))
+
+
+def db_now_statement(dialect_name: str):
+    """Select the database clock; read it with ``db_now_value``."""
+    if dialect_name == "sqlite":
+        # CURRENT_TIMESTAMP has whole seconds only
+        return select(func.strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    return select(func.now())
+
+
+def db_now_value(now) -> datetime:
+    """Convert a ``db_now_statement`` result to a naive UTC datetime."""
+    if isinstance(now, str):
+        return datetime.fromisoformat(now)
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    return now
+
+
+def get_db_now(db: Session) -> datetime:
+    """Current database time as a naive UTC datetime, matching func.now() column defaults."""
+    return db_now_value(db.scalar(db_now_statement(db.get_bind().dialect.name)))
 
 
 def get_story(db: Session, story_id: int) -> Optional[models.Story]:
@@ -10,59 +78,439 @@ def get_story(db: Session, story_id: int) -> Optional[models.Story]:
     return db.query(models.Story).filter(models.Story.id == story_id).first()
 
 
+def encode_cursor(story: models.Story) -> str:
+    """Encode the (score, id) keyset position after ``story`` as an opaque token."""
+    raw = json.dumps([story.score or 0, story.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Decode a cursor from ``encode_cursor``; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, story_id = json.loads(raw)
+        return int(score), int(story_id)
+    except (binascii.Error, TypeError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _escape_like(term: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def stories_statement(
+    skip: int = 0,
+    limit: int = 100,
+    keyword: Optional[str] = None,
+    domain: Optional[str] = None,
+    cursor: Optional[str] = None,
+    tracked_keywords: Optional[Set[str]] = None
+) -> Select:
+    """Build the story listing query (shared by the sync and async crud).
+    
+    With a ``cursor`` the query seeks past the last seen (score, id) using the
+    composite index instead of skipping rows with OFFSET. Keywords found in
+    ``tracked_keywords`` are matched through ``story_keywords``; any other term
+    is a substring search on the title.
+    """
+    query = select(models.Story)
+    
+    # Title substring search is served by the pg_trgm GIN index on PostgreSQL;
+    # SQLite falls back to a scan with the same semantics.
+    if keyword and tracked_keywords and keyword.lower() in tracked_keywords:
+        # Keywords tracked by analytics are looked up in the association table
+        query = query.where(models.Story.id.in_(
+            select(models.StoryKeyword.story_id).where(models.StoryKeyword.keyword == keyword.lower())
+        ))
+    elif keyword:
+        query = query.where(models.Story.title.ilike(f"%{_escape_like(keyword)}%", escape="\\"))
+    
+    if domain:
+        # Exact match on the stored, indexed domain ("x.com" must not match "netflix.com")
+        query = query.where(models.Story.domain == normalize_domain(domain))
+    
+    if cursor:
+        score, story_id = decode_cursor(cursor)
+        query = query.where(tuple_(models.Story.score, models.Story.id) < tuple_(score, story_id))
+    elif skip:
+        query = query.offset(skip)
+    
+    return query.order_by(desc(models.Story.score), desc(models.Story.id)).limit(limit)
+
+
 def get_stories(
     db: Session, 
     skip: int = 0, 
     limit: int = 100,
     keyword: Optional[str] = None,
-    domain: Optional[str] = None
+    domain: Optional[str] = None,
+    cursor: Optional[str] = None,
+    tracked_keywords: Optional[Set[str]] = None
 ) -> List[models.Story]:
     """Get stories with optional filtering."""
-    query = db.query(models.Story)
-    
-    if keyword:
-        query = query.filter(models.Story.title.ilike(f"%{keyword}%"))
-    
-    if domain:
-        query = query.filter(models.Story.url.ilike(f"%{domain}%"))
-    
-    return query.order_by(desc(models.Story.score)).offset(skip).limit(limit).all()
+    statement = stories_statement(skip, limit, keyword, domain, cursor, tracked_keywords)
+    return db.execute(statement).scalars().all()
 
 
 def create_story(db: Session, story: schemas.StoryCreate) -> models.Story:
     """Create a new story."""
-    db_story = models.Story(**story.dict())
+    lock_analytics(db)
+    db_story = models.Story(**story.dict(), domain=_domain_or_none(story.url))
     db.add(db_story)
+    _add_to_count(db, 'stories', 1)
     db.commit()
     db.refresh(db_story)
     return db_story
 
 
-def create_story_from_dict(db: Session, story_data: dict) -> models.Story:
-    """Create a new story from raw dictionary data."""
+def _domain_or_none(url: Optional[str]) -> Optional[str]:
+    """Normalized domain to store on a story, or None when the URL has none."""
+    domain = extract_domain(url)
+    return None if domain == "unknown" else domain
+
+
+def _story_fields(story_data: dict) -> dict:
+    """Map raw HN API data to Story model fields."""
     # Convert timestamp to datetime if needed
     if 'time' in story_data and isinstance(story_data['time'], (int, float)):
-        from datetime import datetime
-        story_data['time'] = datetime.fromtimestamp(story_data['time'])
+        story_data['time'] = from_timestamp(story_data['time'])
     
     # Map HN API fields to model fields
-    story_dict = {
+    return {
         'id': story_data.get('id'),
         'title': story_data.get('title', ''),
         'url': story_data.get('url'),
         'time': story_data.get('time'),
         'score': story_data.get('score', 0),
         'descendants': story_data.get('descendants', 0),
-        'author': story_data.get('by')  # HN API uses 'by' for author
+        'author': story_data.get('by', story_data.get('author')),  # HN API uses 'by' for author
+        'domain': _domain_or_none(story_data.get('url')),
+        'type': story_data.get('type')
     }
-    
-    db_story = models.Story(**story_dict)
+
+
+def create_story_from_dict(db: Session, story_data: dict) -> models.Story:
+    """Create a new story from raw dictionary data."""
+    lock_analytics(db)
+    db_story = models.Story(**_story_fields(story_data))
     db.add(db_story)
+    _add_to_count(db, 'stories', 1)
     db.commit()
     db.refresh(db_story)
     return db_story
 
 
+def _insert_for(db: Session):
+    """Return the dialect-specific ``insert`` construct supporting ON CONFLICT."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported for dialect '{dialect}'")
+    return insert
+
+
+def _upsert_new_keys(db: Session, stmt, key_column, keys: List) -> Set:
+    """Execute an INSERT ... ON CONFLICT statement and return the keys it newly inserted."""
+    if db.get_bind().dialect.name == "postgresql":
+        # xmax = 0 only for rows created by this statement
+        stmt = stmt.returning(key_column, literal_column("xmax = 0"))
+        return {key for key, is_new in db.execute(stmt) if is_new}
+    existing = set(db.scalars(select(key_column).where(key_column.in_(keys))))
+    db.execute(stmt)
+    return set(keys) - existing
+
+
+def bulk_upsert_stories(
+    db: Session,
+    rows: List[dict],
+    update_existing: bool = False,
+    commit: bool = True
+) -> Set[int]:
+    """Insert a batch of stories with INSERT ... ON CONFLICT, one statement per chunk.
+    
+    Rows use raw HN API fields (or the output of ``extract_story_data``). Existing
+    stories are left untouched unless ``update_existing`` is set, in which case
+    their score and descendants are refreshed. Returns the IDs that were newly
+    inserted.
+    """
+    # ON CONFLICT cannot touch the same row twice in one statement
+    values = list({row['id']: row for row in map(_story_fields, rows)}.values())
+    if not values:
+        return set()
+    
+    lock_analytics(db)
+    insert = _insert_for(db)
+    inserted_ids = set()
+    now = get_db_now(db)
+    
+    for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+        chunk = values[start:start + UPSERT_CHUNK_SIZE]
+        chunk_ids = [row['id'] for row in chunk]
+        previous = get_story_stats(db, chunk_ids) if update_existing else {}
+        stmt = insert(models.Story).values(chunk)
+        if update_existing:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.Story.id],
+                set_={
+                    'score': stmt.excluded.score,
+                    'descendants': stmt.excluded.descendants,
+                }
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[models.Story.id])
+        
+        new_ids = _upsert_new_keys(db, stmt, models.Story.id, chunk_ids)
+        inserted_ids.update(new_ids)
+        
+        # Only stories whose values were written can have changed
+        written = chunk if update_existing else [row for row in chunk if row['id'] in new_ids]
+        record_story_snapshots(db, previous, {
+            row['id']: (row['score'], row['descendants']) for row in written
+        }, now)
+    
+    _add_to_count(db, 'stories', len(inserted_ids))
+    if commit:
+        db.commit()
+    return inserted_ids
+
+
+def get_story_stats(db: Session, story_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    """Return the stored (score, descendants) of the given stories with one IN query."""
+    if not story_ids:
+        return {}
+    rows = db.execute(
+        select(models.Story.id, models.Story.score, models.Story.descendants)
+        .where(models.Story.id.in_(story_ids))
+    )
+    return {story_id: (score, descendants) for story_id, score, descendants in rows}
+
+
+def record_story_snapshots(
+    db: Session,
+    previous: Dict[int, Tuple[int, int]],
+    stats: Dict[int, Tuple[int, int]],
+    captured_at: datetime
+) -> None:
+    """Snapshot the (score, descendants) in ``stats`` that differ from ``previous``.
+    
+    A second change captured at the same instant replaces the first.
+    """
+    rows = [
+        {'story_id': story_id, 'captured_at': captured_at, 'score': score or 0, 'descendants': descendants or 0}
+        for story_id, (score, descendants) in sorted(stats.items())
+        if previous.get(story_id) != (score, descendants)
+    ]
+    if not rows:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.StorySnapshot).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.StorySnapshot.story_id, models.StorySnapshot.captured_at],
+        set_={'score': stmt.excluded.score, 'descendants': stmt.excluded.descendants}
+    ))
+
+
+def story_trajectory_statement(story_id: int, since: Optional[datetime] = None) -> Select:
+    """Select a story's snapshots in time order (a range scan of the primary key)."""
+    stmt = (
+        select(models.StorySnapshot)
+        .where(models.StorySnapshot.story_id == story_id)
+        .order_by(models.StorySnapshot.captured_at)
+    )
+    if since is not None:
+        stmt = stmt.where(models.StorySnapshot.captured_at >= since)
+    return stmt
+
+
+def get_story_trajectory(
+    db: Session,
+    story_id: int,
+    since: Optional[datetime] = None
+) -> List[models.StorySnapshot]:
+    """Get a story's score/comment snapshots in time order."""
+    return list(db.scalars(story_trajectory_statement(story_id, since)))
+
+
+def _truncate_time(db: Session, column, unit: str):
+    """SQL expression truncating ``column`` to the start of its 'hour' or 'day'."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(unit, column)
+    return func.strftime('%Y-%m-%d %H' if unit == 'hour' else '%Y-%m-%d', column)
+
+
+def downsample_story_snapshots(
+    db: Session,
+    unit: str,
+    before: datetime,
+    after: Optional[datetime] = None
+) -> int:
+    """Keep only the last snapshot per story and ``unit`` ('hour' or 'day') in [after, before).
+    
+    Returns the number of snapshots removed.
+    """
+    snapshot = models.StorySnapshot
+    in_range = [snapshot.captured_at < before]
+    if after is not None:
+        in_range.append(snapshot.captured_at >= after)
+    keep = (
+        select(snapshot.story_id, func.max(snapshot.captured_at))
+        .where(*in_range)
+        .group_by(snapshot.story_id, _truncate_time(db, snapshot.captured_at, unit))
+    )
+    result = db.execute(
+        delete(snapshot)
+        .where(*in_range, tuple_(snapshot.story_id, snapshot.captured_at).not_in(keep))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def bulk_upsert_comments(db: Session, story_id: int, comments: List[dict]) -> Set[int]:
+    """Insert crawled comments of a story, ignoring known ones; returns the new IDs."""
+    values = list({
+        comment['id']: {
+            'id': comment['id'],
+            'story_id': story_id,
+            'parent_id': comment.get('parent'),
+            'author': comment.get('by'),
+            'text': comment.get('text'),
+            'time': comment.get('time'),
+            'depth': comment.get('depth', 1),
+        }
+        for comment in comments
+    }.values())
+    insert = _insert_for(db)
+    new_ids = set()
+    for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+        chunk = values[start:start + UPSERT_CHUNK_SIZE]
+        stmt = insert(models.Comment).values(chunk).on_conflict_do_nothing(index_elements=[models.Comment.id])
+        new_ids.update(_upsert_new_keys(db, stmt, models.Comment.id, [row['id'] for row in chunk]))
+    return new_ids
+
+
+def increment_story_comment_keywords(db: Session, story_id: int, counts: Dict[str, int]) -> None:
+    """Atomically add keyword mention counts for a story's comments."""
+    if not counts:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.StoryCommentKeyword).values([
+        {'story_id': story_id, 'keyword': keyword, 'count': count}
+        for keyword, count in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.StoryCommentKeyword.story_id, models.StoryCommentKeyword.keyword],
+        set_={'count': models.StoryCommentKeyword.count + stmt.excluded.count}
+    )
+    db.execute(stmt)
+
+
+def story_comment_keywords_statement(story_id: int) -> Select:
+    """Select a story's comment keyword counts, most mentioned first."""
+    return (
+        select(models.StoryCommentKeyword)
+        .where(models.StoryCommentKeyword.story_id == story_id)
+        .order_by(desc(models.StoryCommentKeyword.count), models.StoryCommentKeyword.keyword)
+    )
+
+
+def get_story_comment_keywords(db: Session, story_id: int) -> List[models.StoryCommentKeyword]:
+    """Get a story's comment keyword counts."""
+    return list(db.scalars(story_comment_keywords_statement(story_id)))
+
+
+def get_stories_by_ids(db: Session, story_ids: List[int]) -> List[models.Story]:
+    """Get many stories by ID with a single IN query."""
+    if not story_ids:
+        return []
+    return db.query(models.Story).filter(models.Story.id.in_(list(story_ids))).all()
+
+
+def get_existing_story_ids(db: Session, story_ids: List[int]) -> Set[int]:
+    """Return the subset of ``story_ids`` already stored, using one IN query."""
+    if not story_ids:
+        return set()
+    rows = db.query(models.Story.id).filter(models.Story.id.in_(story_ids)).all()
+    return {row[0] for row in rows}
+
+
+def replace_feed_memberships(
+    db: Session,
+    feed_ids: Dict[str, List[int]],
+    seen_at: datetime,
+    commit: bool = True
+) -> int:
+    """Replace the stored listing of each feed in ``feed_ids`` with its current ranks.
+    
+    Only stories already stored are recorded; feeds missing from ``feed_ids``
+    keep their previous listing. Returns the number of memberships written.
+    """
+    stored_ids = get_existing_story_ids(db, list(set().union(*feed_ids.values())))
+    written = 0
+    for feed, story_ids in sorted(feed_ids.items()):
+        db.execute(delete(models.FeedMembership).where(models.FeedMembership.feed == feed))
+        rows = [
+            {'feed': feed, 'story_id': story_id, 'rank': rank, 'seen_at': seen_at}
+            for rank, story_id in enumerate(story_ids, start=1)
+            if story_id in stored_ids
+        ]
+        # A feed can list an item twice while it is being reordered; keep the best rank
+        rows = list({row['story_id']: row for row in reversed(rows)}.values())
+        insert = _insert_for(db)
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            db.execute(insert(models.FeedMembership).values(rows[start:start + UPSERT_CHUNK_SIZE]))
+        written += len(rows)
+    if commit:
+        db.commit()
+    return written
+
+
+def feed_stories_statement(feed: str, limit: int = 30) -> Select:
+    """Select the stories currently listed on ``feed`` in rank order."""
+    return (
+        select(models.Story)
+        .join(models.FeedMembership, models.FeedMembership.story_id == models.Story.id)
+        .where(models.FeedMembership.feed == feed)
+        .order_by(models.FeedMembership.rank)
+        .limit(limit)
+    )
+
+
+def get_feed_stories(db: Session, feed: str, limit: int = 30) -> List[models.Story]:
+    """Get the stories currently listed on ``feed`` in rank order."""
+    return list(db.scalars(feed_stories_statement(feed, limit)))
+
+
+def mark_stories_analyzed(db: Session, story_ids: List[int], only_new: bool = True) -> Set[int]:
+    """Stamp ``analyzed_at`` on stored stories; returns the IDs that were stamped.
+    
+    With ``only_new`` stories analyzed before are left alone, which makes this
+    a claim: of several transactions analyzing the same story only one gets it
+    back, so its counts are applied once.
+    """
+    if not story_ids:
+        return set()
+    story = models.Story
+    condition = [story.id.in_(story_ids)]
+    if only_new:
+        condition.append(story.analyzed_at.is_(None))
+    stmt = (
+        update(story)
+        .where(*condition)
+        .values(analyzed_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        return set(db.scalars(stmt.returning(story.id)))
+    ids = set(db.scalars(select(story.id).where(*condition)))
+    db.execute(stmt)
+    return ids
+
+
 def get_or_create_story(db: Session, story_data: dict) -> models.Story:
     """Get existing story or create new one."""
     story_id = story_data['id']
@@ -78,6 +526,279 @@ def get_or_create_story(db: Session, story_data: dict) -> models.Story:
     return create_story_from_dict(db, story_data)
 
 
+def increment_keyword_counts(db: Session, counts: Dict[str, int], last_seen: datetime) -> None:
+    """Atomically add ``counts`` to keyword analytics with a single upsert."""
+    if not counts:
+        return
+    insert = _insert_for(db)
+    # Sorted keys give concurrent workers a consistent lock order
+    stmt = insert(models.Analytics).values([
+        {'keyword': keyword, 'count': count, 'last_seen': last_seen}
+        for keyword, count in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Analytics.keyword],
+        set_={
+            'count': models.Analytics.count + stmt.excluded.count,
+            'last_seen': stmt.excluded.last_seen,
+        }
+    )
+    new_keywords = _upsert_new_keys(db, stmt, models.Analytics.keyword, list(counts))
+    _add_to_count(db, 'analytics', len(new_keywords))
+
+
+def increment_domain_counts(db: Session, counts: Dict[str, int]) -> None:
+    """Atomically add ``counts`` to domain analytics with a single upsert."""
+    if not counts:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.Domain).values([
+        {'domain': domain, 'count': count}
+        for domain, count in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Domain.domain],
+        set_={'count': models.Domain.count + stmt.excluded.count}
+    )
+    new_domains = _upsert_new_keys(db, stmt, models.Domain.domain, list(counts))
+    _add_to_count(db, 'domains', len(new_domains))
+
+
+def increment_trend_buckets(db: Session, counts: Dict[Tuple[str, str, datetime], int]) -> None:
+    """Atomically add ``counts`` keyed by (kind, term, hour) to the trend buckets."""
+    if not counts:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.TrendBucket).values([
+        {'kind': kind, 'term': term, 'bucket': bucket, 'count': count}
+        for (kind, term, bucket), count in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.TrendBucket.kind, models.TrendBucket.term, models.TrendBucket.bucket],
+        set_={'count': models.TrendBucket.count + stmt.excluded.count}
+    )
+    db.execute(stmt)
+
+
+def _bucket_range(since: datetime, until: Optional[datetime]) -> list:
+    """Conditions keeping trend buckets from ``since`` up to (not including) ``until``."""
+    conditions = [models.TrendBucket.bucket >= since]
+    if until is not None:
+        conditions.append(models.TrendBucket.bucket < until)
+    return conditions
+
+
+def trend_counts_statement(
+    kind: str,
+    since: datetime,
+    limit: int = 10,
+    until: Optional[datetime] = None
+) -> Select:
+    """Select the top terms of one kind by their total count in buckets from ``since`` to ``until``."""
+    total = func.sum(models.TrendBucket.count).label('count')
+    return (
+        select(models.TrendBucket.term, total)
+        .where(models.TrendBucket.kind == kind, *_bucket_range(since, until))
+        .group_by(models.TrendBucket.term)
+        .order_by(desc(total), models.TrendBucket.term)
+        .limit(limit)
+    )
+
+
+def trending_statement(
+    kind: str,
+    since: datetime,
+    baseline_since: datetime,
+    until: Optional[datetime] = None
+) -> Select:
+    """Select each term's count in the window from ``since`` to ``until`` and in the baseline before it."""
+    bucket, count = models.TrendBucket.bucket, models.TrendBucket.count
+    return (
+        select(
+            models.TrendBucket.term,
+            func.sum(case((bucket >= since, count), else_=0)).label('count'),
+            func.sum(case((bucket < since, count), else_=0)).label('baseline'),
+        )
+        .where(models.TrendBucket.kind == kind, *_bucket_range(baseline_since, until))
+        .group_by(models.TrendBucket.term)
+    )
+
+
+def get_trend_counts(
+    db: Session,
+    kind: str,
+    since: datetime,
+    limit: int = 10,
+    until: Optional[datetime] = None
+) -> List[Tuple[str, int]]:
+    """Get the top terms of one kind between two hours."""
+    return [tuple(row) for row in db.execute(trend_counts_statement(kind, since, limit, until))]
+
+
+def get_trending_rows(
+    db: Session,
+    kind: str,
+    since: datetime,
+    baseline_since: datetime,
+    until: Optional[datetime] = None
+) -> List[Tuple[str, int, int]]:
+    """Get (term, window count, baseline count) rows for trending ranking."""
+    return [tuple(row) for row in db.execute(trending_statement(kind, since, baseline_since, until))]
+
+
+def prune_trend_buckets(db: Session, before: datetime) -> int:
+    """Delete trend buckets older than ``before``; returns the number removed."""
+    result = db.execute(delete(models.TrendBucket).where(models.TrendBucket.bucket < before))
+    db.commit()
+    return result.rowcount
+
+
+def add_story_keywords(db: Session, pairs: List[Tuple[int, str]]) -> None:
+    """Record (story_id, keyword) matches, ignoring ones already stored."""
+    if not pairs:
+        return
+    insert = _insert_for(db)
+    stmt = insert(models.StoryKeyword).values([
+        {'story_id': story_id, 'keyword': keyword} for story_id, keyword in sorted(set(pairs))
+    ])
+    db.execute(stmt.on_conflict_do_nothing())
+
+
+def create_story_keywords_staging(db: Session) -> Table:
+    """Create a temporary staging copy of ``story_keywords`` on the session's connection."""
+    staging = Table(
+        "story_keywords_rebuild", MetaData(),
+        Column("story_id", Integer, primary_key=True),
+        Column("keyword", String(255), primary_key=True),
+        prefixes=["TEMPORARY"],
+    )
+    connection = db.connection()
+    staging.drop(bind=connection, checkfirst=True)
+    staging.create(bind=connection)
+    return staging
+
+
+def replace_analytics(
+    db: Session,
+    keyword_counts: Dict[str, int],
+    domain_counts: Dict[str, int],
+    last_seen: datetime,
+    story_keywords: Table
+) -> None:
+    """Replace keyword/domain analytics and story keywords in the caller's transaction.
+    
+    The caller holds the analytics lock exclusively and has counted every
+    stored story, so all of them are stamped as analyzed. Stories whose
+    keywords changed are stamped again so the daily rollups revisit their
+    days, and the row counts are set to the new totals. Readers keep seeing
+    the old rows until the caller commits.
+    """
+    # PostgreSQL's now() is the start of this long transaction, older than the rollup watermark
+    now = func.clock_timestamp() if db.get_bind().dialect.name == "postgresql" else func.now()
+    staged = select(story_keywords.c.story_id, story_keywords.c.keyword)
+    stored = select(models.StoryKeyword.story_id, models.StoryKeyword.keyword)
+    for changed in (staged.except_(stored).subquery(), stored.except_(staged).subquery()):
+        db.execute(
+            update(models.Story)
+            .where(models.Story.id.in_(select(changed.c.story_id)))
+            .values(analyzed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    db.execute(
+        update(models.Story)
+        .where(models.Story.analyzed_at.is_(None))
+        .values(analyzed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    
+    db.execute(delete(models.Analytics))
+    db.execute(delete(models.Domain))
+    db.execute(delete(models.StoryKeyword))
+    
+    keywords, domains = sorted(keyword_counts.items()), sorted(domain_counts.items())
+    for start in range(0, len(keywords), UPSERT_CHUNK_SIZE):
+        increment_keyword_counts(db, dict(keywords[start:start + UPSERT_CHUNK_SIZE]), last_seen)
+    for start in range(0, len(domains), UPSERT_CHUNK_SIZE):
+        increment_domain_counts(db, dict(domains[start:start + UPSERT_CHUNK_SIZE]))
+    db.execute(models.StoryKeyword.__table__.insert().from_select(['story_id', 'keyword'], staged))
+    _set_count(db, 'analytics', len(keyword_counts))
+    _set_count(db, 'domains', len(domain_counts))
+
+
+def set_story_domains(db: Session, domains: Dict[int, Optional[str]]) -> None:
+    """Store the normalized domain of many stories with one executemany UPDATE."""
+    if not domains:
+        return
+    stories = models.Story.__table__
+    stmt = (
+        update(stories)
+        .where(stories.c.id == bindparam('b_id'))
+        .values(domain=bindparam('b_domain'))
+    )
+    db.execute(stmt, [
+        {'b_id': story_id, 'b_domain': domain} for story_id, domain in domains.items()
+    ])
+
+
+def get_refresh_candidates(db: Session, since: datetime, front_page_ids: List[int]) -> List:
+    """Get stories posted since ``since`` or on the front page, with their refresh state."""
+    story = models.Story
+    condition = story.time >= since
+    if front_page_ids:
+        condition = or_(condition, story.id.in_(front_page_ids))
+    return db.execute(
+        select(story.id, story.time, story.score, story.descendants, story.fetched_at, story.refreshed_at)
+        .where(condition)
+    ).all()
+
+
+def update_story_stats(
+    db: Session,
+    stats: Dict[int, Tuple[int, int]],
+    refreshed_at: datetime,
+    commit: bool = True
+) -> None:
+    """Write fresh (score, descendants) for many stories with one UPDATE per chunk."""
+    items = sorted(stats.items())
+    for start in range(0, len(items), UPSERT_CHUNK_SIZE):
+        chunk = dict(items[start:start + UPSERT_CHUNK_SIZE])
+        previous = get_story_stats(db, list(chunk))
+        db.execute(
+            update(models.Story)
+            .where(models.Story.id.in_(list(chunk)))
+            .values(
+                score=case({story_id: score for story_id, (score, _) in chunk.items()}, value=models.Story.id),
+                descendants=case(
+                    {story_id: comments for story_id, (_, comments) in chunk.items()}, value=models.Story.id
+                ),
+                refreshed_at=refreshed_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        record_story_snapshots(db, previous, chunk, refreshed_at)
+    if commit:
+        db.commit()
+
+
+def backfill_story_domains(db: Session, batch_size: int = 1000) -> int:
+    """Fill in the domain of stories stored before it was persisted; safe to re-run."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(models.Story.id, models.Story.url)
+            .where(models.Story.id > last_id, models.Story.domain.is_(None), models.Story.url.isnot(None))
+            .order_by(models.Story.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+        set_story_domains(db, {row.id: _domain_or_none(row.url) for row in rows})
+        db.commit()
+        updated += len(rows)
+
+
 def get_analytics(db: Session, limit: int = 10) -> List[models.Analytics]:
     """Get top analytics by frequency."""
     return db.query(models.Analytics).order_by(desc(models.Analytics.count)).limit(limit).all()
@@ -88,29 +809,229 @@ def get_domains(db: Session, limit: int = 10) -> List[models.Domain]:
     return db.query(models.Domain).order_by(desc(models.Domain.count)).limit(limit).all()
 
 
-def get_stories_count(db: Session) -> int:
+def get_story_days_changed(db: Session, since: Optional[datetime], until: datetime) -> List[date]:
+    """Get the distinct posting days of stories stored, refreshed or analyzed between ``since`` and ``until``.
+    
+    Each timestamp has its own index, so only the changed stories are read.
+    """
+    day = func.date(models.Story.time, type_=Date)
+    changed = []
+    for column in (models.Story.fetched_at, models.Story.refreshed_at, models.Story.analyzed_at):
+        condition = column <= until
+        if since is not None:
+            condition = condition & (column >= since)
+        changed.append(condition)
+    return list(db.scalars(select(day).where(or_(*changed)).distinct().order_by(day)))
+
+
+def rebuild_daily_rollups(db: Session, day: date) -> None:
+    """Recompute one day's keyword and domain rollups from the stories posted that day.
+    
+    Replaces the day's rows, so re-running it for the same day is harmless.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    in_day = (models.Story.time >= start, models.Story.time < start + timedelta(days=1), NOT_JOB)
+    totals = (
+        literal(day, Date),
+        func.count(),
+        func.coalesce(func.sum(models.Story.score), 0),
+        func.coalesce(func.sum(models.Story.descendants), 0),
+    )
+    columns = ['day', 'story_count', 'score_total', 'comment_total']
+    
+    for kind, (model, term) in ROLLUP_MODELS.items():
+        db.execute(delete(model).where(model.day == day))
+        if kind == 'keyword':
+            source = (
+                select(models.StoryKeyword.keyword, *totals)
+                .join(models.Story, models.Story.id == models.StoryKeyword.story_id)
+                .where(*in_day)
+                .group_by(models.StoryKeyword.keyword)
+            )
+        else:
+            source = (
+                select(models.Story.domain, *totals)
+                .where(*in_day, models.Story.domain.isnot(None))
+                .group_by(models.Story.domain)
+            )
+        db.execute(model.__table__.insert().from_select([term.key] + columns, source))
+
+
+def daily_rollups_statement(
+    kind: str,
+    since: date,
+    term: Optional[str] = None,
+    limit: int = 100
+) -> Select:
+    """Select daily rollup rows of one kind from ``since``, newest day first."""
+    model, term_column = ROLLUP_MODELS[kind]
+    stmt = (
+        select(
+            term_column.label('term'),
+            model.day,
+            model.story_count,
+            (cast(model.score_total, Float) / model.story_count).label('avg_score'),
+            model.comment_total,
+        )
+        .where(model.day >= since)
+        .order_by(desc(model.day), desc(model.story_count), term_column)
+        .limit(limit)
+    )
+    if term:
+        stmt = stmt.where(term_column == (normalize_domain(term) if kind == 'domain' else term.lower()))
+    return stmt
+
+
+def get_daily_rollups(
+    db: Session,
+    kind: str,
+    since: date,
+    term: Optional[str] = None,
+    limit: int = 100
+) -> List[dict]:
+    """Get daily rollup rows of one kind from ``since``."""
+    return [dict(row._mapping) for row in db.execute(daily_rollups_statement(kind, since, term, limit))]
+
+
+def _add_to_count(db: Session, name: str, delta: int) -> None:
+    """Adjust a maintained row count in the caller's transaction.
+    
+    Counters that were never seeded are left alone; reads fall back to
+    COUNT(*) until ``refresh_table_counts`` seeds them.
+    """
+    if delta:
+        db.execute(
+            update(models.TableCount)
+            .where(models.TableCount.name == name)
+            .values(count=models.TableCount.count + delta)
+        )
+
+
+def _set_count(db: Session, name: str, value: int) -> None:
+    """Store a maintained row count in the caller's transaction."""
+    insert = _insert_for(db)
+    stmt = insert(models.TableCount).values(name=name, count=value)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.TableCount.name],
+        set_={'count': stmt.excluded.count}
+    ))
+
+
+def table_count_statement(name: str) -> Select:
+    """Select the maintained row count of a counted table."""
+    return select(models.TableCount.count).where(models.TableCount.name == name)
+
+
+def exact_count_statement(name: str) -> Select:
+    """Select COUNT(*) of a counted table."""
+    return select(func.count()).select_from(COUNTED_MODELS[name])
+
+
+def get_table_count(db: Session, name: str, exact: bool = False) -> int:
+    """Get the row count of one of ``COUNTED_MODELS``.
+    
+    Normally this reads the value the write paths maintain. With ``exact`` (or
+    when the counter has not been seeded yet) the table is counted with
+    COUNT(*); the stored value is only corrected by ``refresh_table_counts``.
+    """
+    if not exact:
+        value = db.scalar(table_count_statement(name))
+        if value is not None:
+            return value
+    return db.scalar(exact_count_statement(name))
+
+
+def refresh_table_counts(db: Session) -> Dict[str, int]:
+    """Recount every counted table exactly and store the results in one transaction."""
+    counts = {name: db.scalar(exact_count_statement(name)) for name in COUNTED_MODELS}
+    for name, value in counts.items():
+        _set_count(db, name, value)
+    db.commit()
+    return counts
+
+
+def get_stories_count(db: Session, exact: bool = False) -> int:
     """Get total number of stories."""
-    return db.query(models.Story).count()
+    return get_table_count(db, 'stories', exact)
 
 
-def get_analytics_count(db: Session) -> int:
+def get_analytics_count(db: Session, exact: bool = False) -> int:
     """Get total number of analytics entries."""
-    return db.query(models.Analytics).count()
+    return get_table_count(db, 'analytics', exact)
 
 
-def get_domains_count(db: Session) -> int:
+def get_domains_count(db: Session, exact: bool = False) -> int:
     """Get total number of domains."""
-    return db.query(models.Domain).count() 
+    return get_table_count(db, 'domains', exact)
+
+
+# Sync state bumped on every keyword change (see KeywordRegistry)
+AI_KEYWORDS_VERSION_STATE = "ai_keywords_version"
 
 
 def create_ai_keyword(db: Session, keyword: str, status: str = "active") -> models.AIKeyword:
-    """Create a new AI keyword entry."""
+    """Create a new AI keyword entry; raises IntegrityError if it exists in any letter case."""
     ai_keyword = models.AIKeyword(keyword=keyword, status=status)
     db.add(ai_keyword)
-    db.commit()
+    try:
+        increment_sync_state(db, AI_KEYWORDS_VERSION_STATE)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
     db.refresh(ai_keyword)
     return ai_keyword
 
 def get_ai_keywords(db: Session):
     """Get all AI keywords."""
-    return db.query(models.AIKeyword).all() 
\ No newline at end of file
+    return db.query(models.AIKeyword).all()
+
+
+def set_ai_keyword_status(db: Session, keyword_id: int, status: str) -> Optional[models.AIKeyword]:
+    """Change a keyword's status; returns None if there is no such keyword."""
+    ai_keyword = db.get(models.AIKeyword, keyword_id)
+    if ai_keyword is None:
+        return None
+    ai_keyword.status = status
+    increment_sync_state(db, AI_KEYWORDS_VERSION_STATE)
+    db.commit()
+    db.refresh(ai_keyword)
+    return ai_keyword
+
+
+def get_sync_state(db: Session, name: str) -> Optional[int]:
+    """Get a persisted checkpoint value, or None if it was never set."""
+    state = db.query(models.SyncState).filter(models.SyncState.name == name).first()
+    return state.value if state else None
+
+
+def increment_sync_state(db: Session, name: str) -> None:
+    """Atomically add one to a counter kept in sync state, starting it at 1."""
+    insert = _insert_for(db)
+    stmt = insert(models.SyncState).values(name=name, value=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.SyncState.name],
+        set_={'value': models.SyncState.value + 1, 'updated_at': func.now()}
+    ))
+
+
+def set_sync_state(db: Session, name: str, value: int, commit: bool = True) -> None:
+    """Persist a checkpoint value."""
+    state = db.query(models.SyncState).filter(models.SyncState.name == name).first()
+    if state:
+        state.value = value
+    else:
+        db.add(models.SyncState(name=name, value=value))
+    if commit:
+        db.commit()
+
+
+def delete_sync_states(db: Session, prefix: str, commit: bool = True) -> int:
+    """Delete the checkpoints whose name starts with ``prefix``; returns how many were removed."""
+    result = db.execute(
+        delete(models.SyncState)
+        .where(models.SyncState.name.startswith(prefix, autoescape=True))
+    )
+    if commit:
+        db.commit()
+    return result.rowcount 
\ No newline at end of file
@@ -1,10 +1,47 @@
+from typing import AsyncIterator, Optional
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from ..core.config import settings
 
+# Async drivers used for the async engine, keyed by backend name
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def _pool_options(url: str) -> dict:
+    """Connection pool settings; SQLite uses its own single-file pooling."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _connect_options(url: str) -> dict:
+    """Run PostgreSQL sessions in UTC so func.now() in naive columns matches ``utcnow()``."""
+    sa_url = make_url(url)
+    if sa_url.get_backend_name() != "postgresql":
+        return {}
+    if sa_url.get_driver_name() == "asyncpg":
+        return {"connect_args": {"server_settings": {"timezone": "UTC"}}}
+    return {"connect_args": {"options": "-c timezone=UTC"}}
+
+
 # Create database engine
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(
+    settings.DATABASE_URL,
+    **_pool_options(settings.DATABASE_URL),
+    **_connect_options(settings.DATABASE_URL)
+)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -12,6 +49,30 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create base class for models
 Base = declarative_base()
 
+# Async engine and session factory, created on first use so the async driver
+# is only required by processes that serve async routes
+_async_engine: Optional[AsyncEngine] = None
+_AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+
+def get_async_database_url(url: str) -> str:
+    """Rewrite a sync database URL to use the matching async driver."""
+    sa_url = make_url(url)
+    backend = sa_url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return sa_url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def get_async_engine() -> AsyncEngine:
+    """Return the shared async engine, creating it on first use."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        url = get_async_database_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(url, **_pool_options(url), **_connect_options(url))
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
 
 def get_db():
     """Dependency to get database session."""
@@ -19,4 +80,20 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session."""
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """Close pooled async connections (call on application shutdown)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _AsyncSessionLocal = None 
\ No newline at end of file
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import (
+    DDL, Column, Integer, BigInteger, String, Text, Date, DateTime, ForeignKey, Index,
+    event, func, inspect, text
+)
 from sqlalchemy.ext.declarative import declarative_base
 from .database import Base
 
@@ -10,11 +13,74 @@ class Story(Base):
     id = Column(Integer, primary_key=True, index=True)  # HN story ID
     title = Column(Text, nullable=False)
     url = Column(Text)
-    time = Column(DateTime, nullable=False)
+    # time and the *_at columns are indexed for the rollup and refresh range scans
+    time = Column(DateTime, nullable=False, index=True)
     score = Column(Integer, default=0)
     descendants = Column(Integer, default=0)  # Number of comments
     author = Column(String(255))
-    fetched_at = Column(DateTime, default=func.now())
+    fetched_at = Column(DateTime, default=func.now(), index=True)
+    domain = Column(String(255), index=True)  # Normalized domain, set at insert time
+    refreshed_at = Column(DateTime, index=True)  # Last score/comment re-poll, None until the first one
+    analyzed_at = Column(DateTime, index=True)  # When its keywords were last counted, None until analyzed
+    type = Column(String(20))  # HN item type ("story" or "job"), None if stored before it was kept
+    
+    __table_args__ = (
+        # Supports keyset pagination ordered by (score, id)
+        Index("ix_stories_score_id", "score", "id"),
+        # Trigram index lets PostgreSQL serve '%term%' title filters from an index
+        Index(
+            "ix_stories_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+class Comment(Base):
+    """Model for Hacker News comments crawled under a story."""
+    __tablename__ = "comments"
+    
+    id = Column(Integer, primary_key=True)  # HN item ID
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), nullable=False, index=True)
+    parent_id = Column(Integer)
+    author = Column(String(255))
+    text = Column(Text)
+    time = Column(DateTime)
+    depth = Column(Integer, nullable=False, default=1)  # 1 = reply to the story
+
+
+class StoryCommentKeyword(Base):
+    """Model for keyword mentions in the comments of each story."""
+    __tablename__ = "story_comment_keywords"
+    
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True)
+    keyword = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class StorySnapshot(Base):
+    """Model for a story's score and comment count at a point in time (changes only)."""
+    __tablename__ = "story_snapshots"
+    
+    # The primary key doubles as the index for a story's trajectory range scan
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True)
+    captured_at = Column(DateTime, primary_key=True)
+    score = Column(Integer, nullable=False, default=0)
+    descendants = Column(Integer, nullable=False, default=0)
+
+
+class FeedMembership(Base):
+    """Model for the stories currently listed on each HN feed and their rank there."""
+    __tablename__ = "feed_memberships"
+    
+    feed = Column(String(20), primary_key=True)  # "top", "new", "best", "ask", "show" or "job"
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True, index=True)
+    rank = Column(Integer, nullable=False)  # 1-based position in the feed
+    seen_at = Column(DateTime, nullable=False)  # Fetch cycle that last listed the story
+    
+    __table_args__ = (
+        # Feed listings read one feed in rank order
+        Index("ix_feed_memberships_feed_rank", "feed", "rank"),
+    )
 
 
 class Analytics(Base):
@@ -34,10 +100,110 @@ class Domain(Base):
     count = Column(Integer, default=0) 
 
 
+class TrendBucket(Base):
+    """Model for hourly keyword and domain counts used by the trending views."""
+    __tablename__ = "trend_buckets"
+    
+    kind = Column(String(20), primary_key=True)  # "keyword" or "domain"
+    term = Column(String(255), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Start of the hour the stories were posted in
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        # Window queries scan one kind over a range of hours
+        Index("ix_trend_buckets_kind_bucket", "kind", "bucket"),
+    )
+
+
+class KeywordDailyRollup(Base):
+    """Model for per-day keyword totals over the stories posted that day."""
+    __tablename__ = "keyword_daily_rollups"
+    
+    keyword = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    story_count = Column(Integer, nullable=False, default=0)
+    score_total = Column(BigInteger, nullable=False, default=0)
+    comment_total = Column(BigInteger, nullable=False, default=0)
+
+
+class DomainDailyRollup(Base):
+    """Model for per-day domain totals over the stories posted that day."""
+    __tablename__ = "domain_daily_rollups"
+    
+    domain = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    story_count = Column(Integer, nullable=False, default=0)
+    score_total = Column(BigInteger, nullable=False, default=0)
+    comment_total = Column(BigInteger, nullable=False, default=0)
+
+
+class StoryKeyword(Base):
+    """Model for the keywords matched in each story."""
+    __tablename__ = "story_keywords"
+    
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True)
+    keyword = Column(String(255), primary_key=True)
+    
+    __table_args__ = (
+        # Keyword drill-downs look up stories by keyword
+        Index("ix_story_keywords_keyword_story", "keyword", "story_id"),
+    )
+
+
 class AIKeyword(Base):
     """Model for storing all AI keywords from config."""
     __tablename__ = "ai_keywords"
-
+    
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     keyword = Column(String(255), unique=True, nullable=False, index=True)
-    status = Column(String(50), default="active", nullable=False) 
\ No newline at end of file
+    status = Column(String(50), default="active", nullable=False) 
+    
+    __table_args__ = (
+        # Keywords are matched case-insensitively, so "AI" and "ai" may not both exist
+        Index("ix_ai_keywords_keyword_lower", func.lower(keyword), unique=True),
+    )
+
+class SyncState(Base):
+    """Model for persisted ingestion checkpoints (e.g. the HN maxitem high-water mark)."""
+    __tablename__ = "sync_state"
+    
+    name = Column(String(100), primary_key=True)
+    value = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class TableCount(Base):
+    """Model for row counts maintained by the write paths instead of COUNT(*)."""
+    __tablename__ = "table_counts"
+    
+    name = Column(String(100), primary_key=True)  # Counted table name
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+# Trigram indexes need the pg_trgm extension before the stories table is created
+PG_TRGM_EXTENSION = DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+event.listen(Story.__table__, "before_create", PG_TRGM_EXTENSION.execute_if(dialect="postgresql"))
+
+
+def add_missing_columns(bind):
+    """Add nullable columns declared after their table was created (no migrations here)."""
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def create_indexes(bind):
+    """Create indexes missing from tables that already existed before they were declared."""
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            conn.execute(PG_TRGM_EXTENSION)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True) 
\ No newline at end of file
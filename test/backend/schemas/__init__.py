@@ -2,12 +2,16 @@
 Pydantic schemas package.
 """
 
-from .story import Story, StoryCreate, StoryListResponse
-from .analytics import Analytics, Domain
+from .story import Story, StoryCreate, StoryListResponse, StorySnapshot
+from .analytics import (
+    Analytics, Domain, TrendCount, TrendingTerm, DailyRollup, AIKeywordCreate, AIKeywordUpdate,
+    CommentKeyword
+)
 from .responses import DashboardResponse
 
 __all__ = [
-    "Story", "StoryCreate", "StoryListResponse",
-    "Analytics", "Domain",
+    "Story", "StoryCreate", "StoryListResponse", "StorySnapshot",
+    "Analytics", "Domain", "TrendCount", "TrendingTerm", "DailyRollup",
+    "AIKeywordCreate", "AIKeywordUpdate", "CommentKeyword",
     "DashboardResponse"
 ] 
\ No newline at end of file
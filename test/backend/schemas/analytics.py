@@ -2,8 +2,9 @@
 Analytics-related Pydantic schemas.
 """
 
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Literal
+from datetime import date, datetime
 
 
 class AnalyticsBase(BaseModel):
@@ -29,5 +30,51 @@ class DomainBase(BaseModel):
 class Domain(DomainBase):
     """Schema for domain response."""
     
+    class Config:
+        from_attributes = True
+
+
+class TrendCount(BaseModel):
+    """Schema for a term's count within a time window."""
+    term: str
+    count: int
+
+
+class TrendingTerm(TrendCount):
+    """Schema for a term ranked by how far it exceeds its baseline rate."""
+    expected: float  # Count the baseline rate predicts for the window
+    velocity: float  # Mentions per hour within the window
+    z_score: float
+
+
+class DailyRollup(BaseModel):
+    """Schema for a keyword's or domain's totals over the stories posted on one day."""
+    term: str
+    day: date
+    story_count: int
+    avg_score: float
+    comment_total: int
+
+
+class AIKeywordCreate(BaseModel):
+    """Schema for adding a tracked keyword."""
+    keyword: str = Field(..., min_length=1, max_length=255)
+    status: Literal["active", "inactive"] = "active"
+    
+    class Config:
+        # Lengths are checked after stripping, so blank keywords are rejected
+        str_strip_whitespace = True
+
+
+class AIKeywordUpdate(BaseModel):
+    """Schema for enabling or disabling a tracked keyword."""
+    status: Literal["active", "inactive"]
+
+
+class CommentKeyword(BaseModel):
+    """Schema for a keyword's mention count in one story's comments."""
+    keyword: str
+    count: int
+    
     class Config:
         from_attributes = True 
\ No newline at end of file
@@ -34,6 +34,17 @@ class Story(StoryBase):
 class StoryListResponse(BaseModel):
     """Schema for story list response."""
     stories: List[Story]
-    total: int
+    total: Optional[int] = None  # Omitted when include_total=false
     page: int
-    per_page: int 
\ No newline at end of file
+    per_page: int
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
+
+
+class StorySnapshot(BaseModel):
+    """Schema for a story's score and comment count at a point in time."""
+    captured_at: datetime
+    score: int
+    descendants: int
+    
+    class Config:
+        from_attributes = True 
\ No newline at end of file
@@ -1,94 +1,248 @@
+import math
 import re
-from typing import List, Dict, Set
-from urllib.parse import urlparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Dict, FrozenSet, Set, Iterable, Iterator, Optional, Tuple, Union
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..database.models import Story, Analytics, Domain
+from ..database import crud
+from .keyword_matcher import KeywordMatcher
+from .keyword_registry import KeywordRegistry, keyword_registry
 from ..core.config import settings
+from ..core.utils import extract_domain, from_timestamp, hour_bucket, html_to_text, utcnow, window_start
+
+
+class AnalyticsDeltas:
+    """In-memory keyword and domain count increments for a batch of stories."""
+    
+    def __init__(self):
+        self.keywords: Counter = Counter()
+        self.domains: Counter = Counter()
+        self.story_keywords: List[Tuple[int, str]] = []
+        self.buckets: Counter = Counter()  # (kind, term, hour) -> count
+        self.last_seen = utcnow()
+    
+    def add(
+        self,
+        keywords: Iterable[str],
+        domain: str,
+        story_id: Optional[int] = None,
+        time: Optional[datetime] = None
+    ):
+        """Record one story's keywords and domain, bucketed by the hour it was posted."""
+        keywords = list(keywords)
+        bucket = hour_bucket(time or self.last_seen)
+        self.keywords.update(keywords)
+        self.buckets.update(('keyword', keyword, bucket) for keyword in keywords)
+        if domain != "unknown":
+            self.domains[domain] += 1
+            self.buckets[('domain', domain, bucket)] += 1
+        if story_id is not None:
+            self.story_keywords.extend((story_id, keyword) for keyword in keywords)
+    
+    def __bool__(self) -> bool:
+        return bool(self.keywords or self.domains or self.story_keywords)
+
+
+# Matcher of the last keyword set seen by _extract_batch in this process
+_batch_matcher: Optional[KeywordMatcher] = None
+
+
+def _extract_batch(keywords: Tuple[str, ...], rows: List[Tuple[int, str, Optional[str]]]) -> AnalyticsDeltas:
+    """Collect keyword/domain deltas for (id, title, url) rows; picklable for worker processes."""
+    global _batch_matcher
+    if _batch_matcher is None or _batch_matcher.keywords != sorted(set(keywords)):
+        _batch_matcher = KeywordMatcher(keywords)
+    matcher = _batch_matcher
+    deltas = AnalyticsDeltas()
+    found = matcher.find_many([title or '' for _, title, _ in rows])
+    for (story_id, _, url), story_keywords in zip(rows, found):
+        deltas.add(story_keywords, extract_domain(url), story_id)
+    return deltas
 
 
 class AnalyticsService:
     """Service for processing stories and generating analytics."""
     
-    def __init__(self):
-        self.ai_keywords = set(keyword.lower() for keyword in settings.AI_KEYWORDS)
+    # Sync state holding the fetched_at watermark (epoch seconds) of the daily rollups
+    ROLLUP_STATE = "rollup_fetched_at"
+    
+    def __init__(
+        self,
+        keywords: Optional[Iterable[str]] = None,
+        registry: Optional[KeywordRegistry] = None
+    ):
+        # Fixed keywords bypass the registry (used by tests and one-off tools)
+        self._fixed_keywords = (
+            frozenset(keyword.lower() for keyword in keywords) if keywords is not None else None
+        )
+        self._fixed_matcher = (
+            KeywordMatcher(self._fixed_keywords) if self._fixed_keywords is not None else None
+        )
+        self.registry = registry or keyword_registry
+    
+    def keywords(self, db: Optional[Session] = None) -> FrozenSet[str]:
+        """Return the tracked keywords, picking up registry changes when given a session."""
+        if self._fixed_keywords is not None:
+            return self._fixed_keywords
+        return self.registry.keywords(db)
+    
+    def matcher_for(self, db: Optional[Session] = None) -> KeywordMatcher:
+        """Return the compiled matcher for the tracked keywords."""
+        if self._fixed_matcher is not None:
+            return self._fixed_matcher
+        return self.registry.matcher(db)
+    
+    @property
+    def ai_keywords(self) -> FrozenSet[str]:
+        return self.keywords()
+    
+    @property
+    def matcher(self) -> KeywordMatcher:
+        return self.matcher_for()
     
     def extract_keywords(self, title: str) -> Set[str]:
         """Extract AI-related keywords from story title."""
-        title_lower = title.lower()
-        found_keywords = set()
-        
-        for keyword in self.ai_keywords:
-            if keyword in title_lower:
-                found_keywords.add(keyword)
-        
-        return found_keywords
+        return self.matcher.find(title)
+    
+    def extract_keywords_many(self, titles: List[str], db: Optional[Session] = None) -> List[Set[str]]:
+        """Extract AI-related keywords from many story titles."""
+        return self.matcher_for(db).find_many(titles)
     
     def extract_domain(self, url: str) -> str:
         """Extract domain from URL."""
-        if not url:
-            return "unknown"
-        
-        try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            # Remove www. prefix if present
-            if domain.startswith('www.'):
-                domain = domain[4:]
-            return domain
-        except:
-            return "unknown"
-    
-    def process_story(self, db: Session, story: Story) -> Dict[str, List[str]]:
-        """Process a story and update analytics."""
-        # Extract keywords from title
-        keywords = self.extract_keywords(story.title)
-        
-        # Extract domain from URL
-        domain = self.extract_domain(story.url)
-        
-        # Update keyword analytics
-        for keyword in keywords:
-            self._update_keyword_analytics(db, keyword)
-        
-        # Update domain analytics
-        if domain != "unknown":
-            self._update_domain_analytics(db, domain)
+        return extract_domain(url)
+    
+    def collect(self, deltas: AnalyticsDeltas, title: str, url: str) -> Dict[str, List[str]]:
+        """Extract keywords and domain for one story and add them to ``deltas``."""
+        keywords = self.extract_keywords(title)
+        domain = self.extract_domain(url)
+        deltas.add(keywords, domain)
         
         return {
             'keywords': list(keywords),
             'domain': domain
         }
     
-    def _update_keyword_analytics(self, db: Session, keyword: str):
-        """Update keyword frequency in analytics table."""
-        from datetime import datetime
+    def apply_deltas(
+        self,
+        db: Session,
+        deltas: AnalyticsDeltas,
+        commit: bool = True,
+        update_counts: bool = True
+    ):
+        """Write aggregated deltas with one statement per table.
         
-        analytics = db.query(Analytics).filter(Analytics.keyword == keyword).first()
+        Per-story keyword matches are always recorded; the counters are skipped
+        when ``update_counts`` is False (e.g. when backfilling).
+        """
+        if update_counts:
+            crud.increment_keyword_counts(db, deltas.keywords, deltas.last_seen)
+            crud.increment_domain_counts(db, deltas.domains)
+            crud.increment_trend_buckets(db, deltas.buckets)
+        crud.add_story_keywords(db, deltas.story_keywords)
+        if commit:
+            db.commit()
+    
+    def process_story(self, db: Session, story: Story) -> Optional[Dict[str, List[str]]]:
+        """Process a story and update analytics; None if it was already analyzed."""
+        results = self.process_stories(db, [story])
+        return results[0] if results else None
+    
+    def process_stories(
+        self,
+        db: Session,
+        stories: Iterable[Union[Story, dict]],
+        commit: bool = True,
+        update_counts: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Process many stories (ORM objects or raw dicts) and update analytics.
         
-        if analytics:
-            analytics.count += 1
-            analytics.last_seen = datetime.now()
+        Keywords are extracted for all titles in one batch call and the combined
+        deltas are written in a single transaction. Stored stories are stamped
+        as analyzed and get keyword pairs; raw dicts that were never stored only
+        count. With ``update_counts`` the ones analyzed before (e.g. from a
+        redelivered event) are skipped so their counts are not applied twice.
+        Job postings are left out. Returns one result per story processed.
+        """
+        crud.lock_analytics(db)
+        fields = [self._story_fields(story) for story in stories if not self._is_job(story)]
+        story_ids = [story_id for story_id, _, _, _ in fields if story_id is not None]
+        stored_ids = crud.get_existing_story_ids(db, story_ids)
+        if update_counts:
+            claimed = crud.mark_stories_analyzed(db, story_ids)
+            fields = [field for field in fields if field[0] not in stored_ids - claimed]
         else:
-            analytics = Analytics(
-                keyword=keyword,
-                count=1,
-                last_seen=datetime.now()
-            )
-            db.add(analytics)
+            crud.mark_stories_analyzed(db, story_ids, only_new=False)
+        keyword_sets = self.extract_keywords_many([title for _, title, _, _ in fields], db)
         
-        db.commit()
-    
-    def _update_domain_analytics(self, db: Session, domain: str):
-        """Update domain frequency in domains table."""
-        domain_record = db.query(Domain).filter(Domain.domain == domain).first()
+        deltas = AnalyticsDeltas()
+        results = []
+        for (story_id, _, url, time), keywords in zip(fields, keyword_sets):
+            domain = self.extract_domain(url)
+            # Keyword pairs reference stories, so only stored ones get them
+            deltas.add(keywords, domain, story_id if story_id in stored_ids else None, time)
+            results.append({
+                'story_id': story_id,
+                'keywords': list(keywords),
+                'domain': domain
+            })
         
-        if domain_record:
-            domain_record.count += 1
-        else:
-            domain_record = Domain(domain=domain, count=1)
-            db.add(domain_record)
+        self.apply_deltas(db, deltas, commit=commit, update_counts=update_counts)
+        return results
+    
+    def process_comments(
+        self,
+        db: Session,
+        story_id: int,
+        comments: Iterable[dict],
+        commit: bool = True
+    ) -> Counter:
+        """Count keyword mentions in a story's comments and add them to its totals.
         
-        db.commit()
+        Pass each comment once (e.g. only newly stored ones); returns the counts added.
+        """
+        texts = [html_to_text(comment.get('text')) for comment in comments]
+        counts = Counter()
+        for keywords in self.extract_keywords_many(texts, db):
+            counts.update(keywords)
+        crud.increment_story_comment_keywords(db, story_id, counts)
+        if commit:
+            db.commit()
+        return counts
+    
+    def backfill_story_associations(self, db: Session, batch_size: int = 1000) -> int:
+        """Record keyword matches for all stored stories without touching counters."""
+        processed = 0
+        last_id = 0
+        while True:
+            stories = (
+                db.query(Story).filter(Story.id > last_id).order_by(Story.id).limit(batch_size).all()
+            )
+            if not stories:
+                return processed
+            last_id = stories[-1].id
+            self.process_stories(db, stories, update_counts=False)
+            processed += len(stories)
+            db.expunge_all()
+    
+    @staticmethod
+    def _is_job(story: Union[Story, dict]) -> bool:
+        return (story.get('type') if isinstance(story, dict) else story.type) == 'job'
+    
+    @staticmethod
+    def _story_fields(
+        story: Union[Story, dict]
+    ) -> Tuple[Optional[int], str, Optional[str], Optional[datetime]]:
+        """Return (id, title, url, time) for an ORM story or a raw story dict."""
+        if isinstance(story, dict):
+            time = story.get('time')
+            if isinstance(time, (int, float)):
+                time = from_timestamp(time)
+            return story.get('id'), story.get('title') or '', story.get('url'), time
+        return story.id, story.title or '', story.url, story.time
     
     def get_top_keywords(self, db: Session, limit: int = 10) -> List[Analytics]:
         """Get top keywords by frequency."""
@@ -98,11 +252,151 @@ class AnalyticsService:
         """Get top domains by frequency."""
         return db.query(Domain).order_by(Domain.count.desc()).limit(limit).all()
     
+    def trend_windows(self, hours: int, now: Optional[datetime] = None) -> Tuple[datetime, datetime, datetime]:
+        """Return the start and end of a window of complete hours, and the start of the baseline before it.
+        
+        The current hour is left out: its bucket is still filling, so counting
+        it would make a "1h" window cover anything from a few seconds to an hour.
+        """
+        since = window_start(hours, now)
+        until = since + timedelta(hours=hours)
+        return since, until, since - timedelta(hours=settings.TREND_BASELINE_HOURS)
+    
+    def rank_trending(
+        self,
+        rows: Iterable[Tuple[str, int, int]],
+        hours: int,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Rank terms by how far their window count exceeds their baseline rate.
+        
+        ``rows`` are (term, window count, baseline count) as returned by
+        ``crud.get_trending_rows``. The z-score treats counts as Poisson, with one
+        pseudo-count so terms with no history don't divide by zero.
+        """
+        baseline_hours = settings.TREND_BASELINE_HOURS
+        ranked = []
+        for term, count, baseline in rows:
+            if not count:
+                continue
+            expected = baseline * hours / baseline_hours
+            ranked.append({
+                'term': term,
+                'count': count,
+                'expected': round(expected, 2),
+                'velocity': round(count / hours, 2),
+                'z_score': round((count - expected) / math.sqrt(expected + 1), 2),
+            })
+        ranked.sort(key=lambda item: (-item['z_score'], -item['count'], item['term']))
+        return ranked[:limit]
+    
+    def rebuild_analytics(
+        self,
+        db: Session,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Recompute keyword/domain analytics and story keywords from every stored story.
+        
+        Stories are streamed with a server-side cursor, ``batch_size`` rows at a
+        time, and matched in up to ``workers`` processes, so memory is bounded
+        by the number of distinct keywords and domains. Matches are staged in a
+        temporary table and everything is swapped in by one commit. The
+        analytics lock is held exclusively throughout, so stories are neither
+        stored nor counted meanwhile; stories whose keywords changed are
+        stamped as analyzed so the daily rollups revisit just their days.
+        """
+        batch_size = batch_size or settings.REBUILD_BATCH_SIZE
+        workers = settings.REBUILD_WORKERS if workers is None else workers
+        crud.lock_analytics(db, exclusive=True)
+        keywords = tuple(sorted(self.keywords(db)))
+        staging = crud.create_story_keywords_staging(db)
+        totals = AnalyticsDeltas()
+        processed = 0
+        
+        def merge(deltas: AnalyticsDeltas):
+            totals.keywords.update(deltas.keywords)
+            totals.domains.update(deltas.domains)
+            if deltas.story_keywords:
+                db.execute(staging.insert(), [
+                    {'story_id': story_id, 'keyword': keyword}
+                    for story_id, keyword in deltas.story_keywords
+                ])
+        
+        def batches(stmt) -> Iterator[List[Tuple[int, str, Optional[str]]]]:
+            nonlocal processed
+            for rows in db.execute(stmt.execution_options(yield_per=batch_size)).partitions():
+                processed += len(rows)
+                yield [tuple(row) for row in rows]
+        
+        stories = select(Story.id, Story.title, Story.url).where(crud.NOT_JOB)
+        for deltas in self._extract_batches(keywords, batches(stories), workers):
+            merge(deltas)
+        
+        crud.replace_analytics(db, totals.keywords, totals.domains, totals.last_seen, staging)
+        # Temporary tables belong to this connection, which is released on commit
+        staging.drop(bind=db.connection())
+        db.commit()
+        
+        return {
+            'stories': processed,
+            'keywords': len(totals.keywords),
+            'domains': len(totals.domains)
+        }
+    
+    @staticmethod
+    def _extract_batches(
+        keywords: Tuple[str, ...],
+        batches: Iterable[List[Tuple[int, str, Optional[str]]]],
+        workers: int
+    ) -> Iterator[AnalyticsDeltas]:
+        """Run ``_extract_batch`` over ``batches``, in a process pool if ``workers`` > 1.
+        
+        At most two batches per worker are in flight so reading never runs far
+        ahead of matching.
+        """
+        if workers <= 1:
+            for rows in batches:
+                yield _extract_batch(keywords, rows)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for rows in batches:
+                pending.append(pool.submit(_extract_batch, keywords, rows))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def update_daily_rollups(self, db: Session) -> Dict[str, Any]:
+        """Bring the daily keyword/domain rollups up to date.
+        
+        Only stories stored, refreshed or analyzed since the last run are looked
+        at, so a day is revisited when the processor analyzes its stories late.
+        Each posting day they touch is recomputed in full, so an interrupted run
+        is simply repeated. The watermark trails the database clock by ROLLUP_LAG_SECONDS
+        so rows from still-open transactions are not skipped.
+        """
+        until = crud.get_db_now(db) - timedelta(seconds=settings.ROLLUP_LAG_SECONDS)
+        watermark = crud.get_sync_state(db, self.ROLLUP_STATE)
+        since = None
+        if watermark is not None:
+            since = datetime.fromtimestamp(watermark, timezone.utc).replace(tzinfo=None)
+        
+        days = crud.get_story_days_changed(db, since, until)
+        for day in days:
+            crud.rebuild_daily_rollups(db, day)
+            db.commit()
+        
+        crud.set_sync_state(db, self.ROLLUP_STATE, int(until.replace(tzinfo=timezone.utc).timestamp()))
+        return {'days_updated': len(days), 'watermark': until.isoformat()}
+    
     def get_analytics_summary(self, db: Session) -> Dict[str, int]:
         """Get analytics summary."""
-        total_keywords = db.query(Analytics).count()
-        total_domains = db.query(Domain).count()
-        total_stories = db.query(Story).count()
+        total_keywords = crud.get_analytics_count(db)
+        total_domains = crud.get_domains_count(db)
+        total_stories = crud.get_stories_count(db)
         
         return {
             'total_keywords': total_keywords,
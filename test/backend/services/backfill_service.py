@@ -0,0 +1,194 @@
+"""
+Resumable historical backfill walking HN item IDs downward from maxitem.
+"""
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..database import crud
+from .analytics_service import AnalyticsService
+from .hn_service import HackerNewsService
+
+
+class BackfillFetchError(RuntimeError):
+    """Raised when a shard stopped at items whose fetch failed."""
+
+
+class BackfillProgress:
+    """Items scanned and stories stored by a backfill run, with the scan rate."""
+    
+    def __init__(self):
+        self.items = 0
+        self.stories = 0
+        self.new_stories = 0
+        self.started = time.monotonic()
+    
+    def add(self, items: int, stories: int, new_stories: int):
+        self.items += items
+        self.stories += stories
+        self.new_stories += new_stories
+    
+    @property
+    def items_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.items / elapsed if elapsed > 0 else 0.0
+    
+    def as_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "stories": self.stories,
+            "new_stories": self.new_stories,
+            "items_per_second": round(self.items_per_second, 1),
+        }
+
+
+class BackfillService:
+    """Walks item IDs from maxitem down to ``min_item`` and stores the stories found.
+    
+    The ID range is split into shards that are walked concurrently, each in
+    chunks of ``chunk_size`` IDs. A shard's checkpoint (the next ID to fetch)
+    is written in the same transaction as the chunk's stories, so a crashed or
+    interrupted backfill resumes after the last stored chunk. A shard whose
+    item fetches fail stops with its checkpoint at the highest failed ID. The
+    plan (top ID, lowest ID and shard count) is kept until the backfill is
+    restarted.
+    """
+    
+    STATE_PREFIX = "backfill_"
+    TOP_STATE = "backfill_top"
+    FLOOR_STATE = "backfill_floor"
+    SHARDS_STATE = "backfill_shards"
+    
+    def __init__(
+        self,
+        hn_service: Optional[HackerNewsService] = None,
+        analytics_service: Optional[AnalyticsService] = None,
+        chunk_size: Optional[int] = None
+    ):
+        self.hn_service = hn_service or HackerNewsService()
+        self.analytics_service = analytics_service or AnalyticsService()
+        self.chunk_size = chunk_size or settings.BACKFILL_CHUNK_SIZE
+    
+    @classmethod
+    def _next_state(cls, shard: int) -> str:
+        return f"{cls.STATE_PREFIX}next_{shard}"
+    
+    @staticmethod
+    def _shard_size(top: int, floor: int, shards: int) -> int:
+        return max(-(-(top - floor + 1) // shards), 1)
+    
+    def plan(self, db: Session, max_item: int, shards: int = 1, min_item: int = 1) -> None:
+        """Store a new backfill plan from ``max_item`` down to ``min_item``."""
+        shards = max(shards, 1)
+        size = self._shard_size(max_item, min_item, shards)
+        crud.delete_sync_states(db, self.STATE_PREFIX, commit=False)
+        for shard in range(shards):
+            crud.set_sync_state(db, self._next_state(shard), max_item - shard * size, commit=False)
+        crud.set_sync_state(db, self.TOP_STATE, max_item, commit=False)
+        crud.set_sync_state(db, self.FLOOR_STATE, min_item, commit=False)
+        crud.set_sync_state(db, self.SHARDS_STATE, shards)
+    
+    async def start(
+        self,
+        db: Session,
+        shards: Optional[int] = None,
+        min_item: int = 1,
+        restart: bool = False
+    ) -> bool:
+        """Plan a backfill from the current maxitem unless one is stored; returns True if planned."""
+        if not restart and crud.get_sync_state(db, self.TOP_STATE) is not None:
+            return False
+        async with self.hn_service:
+            max_item = await self.hn_service.get_max_item()
+        self.plan(db, max_item, shards or settings.BACKFILL_SHARDS, min_item)
+        return True
+    
+    def remaining(self, db: Session) -> List[Tuple[int, int, int]]:
+        """Return (shard, next ID, lowest ID) for every shard with IDs left to walk."""
+        top = crud.get_sync_state(db, self.TOP_STATE)
+        if top is None:
+            return []
+        floor = crud.get_sync_state(db, self.FLOOR_STATE)
+        shards = crud.get_sync_state(db, self.SHARDS_STATE)
+        size = self._shard_size(top, floor, shards)
+        
+        remaining = []
+        for shard in range(shards):
+            next_id = crud.get_sync_state(db, self._next_state(shard))
+            low = max(top - (shard + 1) * size + 1, floor)
+            if next_id is not None and next_id >= low:
+                remaining.append((shard, next_id, low))
+        return remaining
+    
+    def _store_chunk(self, db: Session, shard: int, stories: List[dict], next_id: int) -> int:
+        """Upsert a chunk's stories, apply their analytics and move the checkpoint in one transaction."""
+        try:
+            new_ids = crud.bulk_upsert_stories(db, stories, commit=False)
+            crud.set_sync_state(db, self._next_state(shard), next_id, commit=False)
+            new_stories = [story for story in stories if story['id'] in new_ids]
+            self.analytics_service.process_stories(db, new_stories)
+            return len(new_ids)
+        except Exception:
+            # Leave the checkpoint where it was so the chunk is retried on resume
+            db.rollback()
+            raise
+    
+    async def _walk_shard(
+        self,
+        db: Session,
+        shard: int,
+        next_id: int,
+        low: int,
+        max_chunks: Optional[int],
+        progress: BackfillProgress,
+        on_chunk: Optional[Callable[[int, int, BackfillProgress], None]]
+    ):
+        chunks = 0
+        while next_id >= low and (max_chunks is None or chunks < max_chunks):
+            chunk_low = max(next_id - self.chunk_size + 1, low)
+            item_ids = list(range(next_id, chunk_low - 1, -1))
+            stories, failed_ids = await self.hn_service.fetch_stories(item_ids)
+            # Never checkpoint past an item that could not be fetched
+            checkpoint = max(failed_ids) if failed_ids else chunk_low - 1
+            new_count = self._store_chunk(db, shard, stories, checkpoint)
+            
+            progress.add(len(item_ids), len(stories), new_count)
+            next_id = checkpoint
+            chunks += 1
+            if on_chunk:
+                on_chunk(shard, next_id, progress)
+            if failed_ids:
+                raise BackfillFetchError(
+                    f"Shard {shard} stopped at item {checkpoint}: {len(failed_ids)} item fetches failed"
+                )
+    
+    async def run(
+        self,
+        db: Session,
+        shards: Optional[List[int]] = None,
+        max_chunks: Optional[int] = None,
+        progress: Optional[BackfillProgress] = None,
+        on_chunk: Optional[Callable[[int, int, BackfillProgress], None]] = None
+    ) -> BackfillProgress:
+        """Walk the remaining shards (or only ``shards``) concurrently.
+        
+        Each shard stops after ``max_chunks`` chunks if given. Item requests
+        across all shards share the HN service's concurrency cap. If a shard
+        fails the others still run to completion, then the first error is raised.
+        """
+        progress = progress or BackfillProgress()
+        pending = [
+            (shard, next_id, low) for shard, next_id, low in self.remaining(db)
+            if shards is None or shard in shards
+        ]
+        async with self.hn_service:
+            results = await asyncio.gather(*(
+                self._walk_shard(db, shard, next_id, low, max_chunks, progress, on_chunk)
+                for shard, next_id, low in pending
+            ), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return progress 
\ No newline at end of file
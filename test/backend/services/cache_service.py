@@ -0,0 +1,105 @@
+import json
+import time
+import redis
+import redis.asyncio as aioredis
+from typing import Any, Dict, Optional, Tuple
+from ..core.config import settings
+
+
+class CacheService:
+    """Two-tier response cache: a short-lived in-process tier in front of Redis.
+    
+    Keys embed a shared version number that writers bump with ``invalidate()``
+    whenever new stories or analytics are committed, so every API worker stops
+    serving old entries without having to delete them. A request computes its
+    versioned key once with ``key()`` and passes it to ``get`` and ``set``, so a
+    value is stored under the version it was read against. The read path is
+    async so API handlers never block the event loop on Redis; ``invalidate()``
+    is called by sync writers. Cache errors never fail a request; with short
+    socket timeouts an unreachable Redis just falls through to the database.
+    """
+    
+    VERSION_KEY = "cache:analytics:version"
+    MAX_LOCAL_ENTRIES = 256
+    
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        async_redis_client: Optional[aioredis.Redis] = None
+    ):
+        timeouts = {
+            "socket_timeout": settings.CACHE_SOCKET_TIMEOUT_SECONDS,
+            "socket_connect_timeout": settings.CACHE_SOCKET_TIMEOUT_SECONDS,
+        }
+        self.redis_client = redis_client or redis.from_url(settings.REDIS_URL, **timeouts)
+        self.async_redis_client = async_redis_client or aioredis.from_url(settings.REDIS_URL, **timeouts)
+        self.enabled = settings.CACHE_ENABLED
+        self.ttl = settings.CACHE_TTL_SECONDS
+        self.local_ttl = settings.CACHE_LOCAL_TTL_SECONDS
+        self._local: Dict[str, Tuple[float, Any]] = {}
+        self._version: Optional[int] = None
+        self._version_expires = 0.0
+    
+    async def _get_version(self) -> int:
+        """Return the current cache version, re-reading Redis at most every local TTL."""
+        now = time.monotonic()
+        if self._version is None or now >= self._version_expires:
+            self._version = int(await self.async_redis_client.get(self.VERSION_KEY) or 0)
+            self._version_expires = now + self.local_ttl
+        return self._version
+    
+    async def key(self, name: str) -> Optional[str]:
+        """Return the versioned key for ``name``, or None while caching is off or unavailable."""
+        if not self.enabled:
+            return None
+        try:
+            return f"cache:{name}:v{await self._get_version()}"
+        except (redis.RedisError, ValueError) as e:
+            print(f"Cache version read failed for '{name}': {e}")
+            return None
+    
+    async def get(self, key: Optional[str]) -> Optional[Any]:
+        """Return the value cached under a ``key()``, checking the local tier before Redis."""
+        if key is None:
+            return None
+        try:
+            now = time.monotonic()
+            local = self._local.get(key)
+            if local and local[0] > now:
+                return local[1]
+            
+            raw = await self.async_redis_client.get(key)
+            if raw is None:
+                return None
+            value = json.loads(raw)
+            self._set_local(key, value)
+            return value
+        except (redis.RedisError, ValueError) as e:
+            print(f"Cache read failed for '{key}': {e}")
+            return None
+    
+    async def set(self, key: Optional[str], value: Any):
+        """Store a JSON-serializable value under a ``key()`` in both tiers."""
+        if key is None:
+            return
+        try:
+            await self.async_redis_client.set(key, json.dumps(value), ex=self.ttl)
+            self._set_local(key, value)
+        except (redis.RedisError, TypeError) as e:
+            print(f"Cache write failed for '{key}': {e}")
+    
+    def _set_local(self, key: str, value: Any):
+        if len(self._local) >= self.MAX_LOCAL_ENTRIES:
+            self._local.clear()
+        self._local[key] = (time.monotonic() + self.local_ttl, value)
+    
+    def invalidate(self):
+        """Bump the shared version so all workers miss on their next read."""
+        self._local.clear()
+        self._version = None
+        if not self.enabled:
+            return
+        try:
+            self.redis_client.incr(self.VERSION_KEY)
+        except redis.RedisError as e:
+            print(f"Cache invalidation failed: {e}") 
\ No newline at end of file
@@ -1,50 +1,226 @@
 import httpx
 import asyncio
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from ..core.config import settings
+from ..core.utils import from_timestamp
 
 
 class HackerNewsService:
-    """Service for fetching data from Hacker News API."""
+    """Service for fetching data from Hacker News API.
     
-    def __init__(self):
+    Owns a pooled, keep-alive HTTP client shared by all calls; a semaphore caps
+    in-flight requests. The client is recreated if used from a new event loop.
+    """
+    
+    def __init__(self, max_concurrency: Optional[int] = None):
         self.base_url = settings.HN_API_BASE_URL
         self.limit = settings.HN_TOP_STORIES_LIMIT
+        self.max_concurrency = max_concurrency or settings.HN_MAX_CONCURRENCY
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def __aenter__(self) -> "HackerNewsService":
+        self._get_client()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    def _http2_enabled(self) -> bool:
+        """Return True if HTTP/2 is requested and the `h2` package is available."""
+        if not settings.HN_HTTP2:
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("HN_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+            return False
+        return True
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the pooled client, creating it for the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # A client from a previous (now closed) loop cannot be reused;
+            # drop it without awaiting, its transports died with that loop.
+            self._client = httpx.AsyncClient(
+                http2=self._http2_enabled(),
+                timeout=settings.HN_REQUEST_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.HN_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HN_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+    
+    async def _get_json(self, path: str) -> Any:
+        """GET a path relative to the API base URL, bounded by the concurrency cap."""
+        client = self._get_client()
+        async with self._semaphore:
+            response = await client.get(f"{self.base_url}/{path}")
+            response.raise_for_status()
+            return response.json()
+    
+    async def aclose(self):
+        """Close the pooled client (call on application/worker shutdown)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._semaphore = None
+        self._loop = None
     
     async def get_top_stories(self) -> List[int]:
         """Fetch top story IDs from HN API."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/topstories.json")
-            response.raise_for_status()
-            story_ids = response.json()
-            return story_ids[:self.limit]
+        story_ids = await self._get_json("topstories.json")
+        return story_ids[:self.limit]
+    
+    async def get_feed(self, feed: str) -> List[int]:
+        """Fetch the ranked item IDs of one feed ("top", "new", "best", "ask", "show", "job")."""
+        if feed == "top":
+            return await self.get_top_stories()
+        story_ids = await self._get_json(f"{feed}stories.json")
+        return (story_ids or [])[:settings.HN_FEED_LIMIT]
+    
+    async def get_feeds(self, feeds: List[str]) -> Dict[str, List[int]]:
+        """Fetch several feeds concurrently; a feed that fails is logged and left out."""
+        results = await asyncio.gather(*(self.get_feed(feed) for feed in feeds), return_exceptions=True)
+        feed_ids = {}
+        for feed, result in zip(feeds, results):
+            if isinstance(result, Exception):
+                print(f"Failed to fetch {feed} feed: {result}")
+                continue
+            feed_ids[feed] = result
+        return feed_ids
     
     async def get_story(self, story_id: int) -> Dict[str, Any]:
         """Fetch individual story details from HN API."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/item/{story_id}.json")
-            response.raise_for_status()
-            return response.json()
+        return await self._get_json(f"item/{story_id}.json")
     
-    async def get_top_stories_details(self) -> List[Dict[str, Any]]:
-        """Fetch details for top stories."""
-        story_ids = await self.get_top_stories()
+    async def get_max_item(self) -> int:
+        """Fetch the current largest item ID from HN API."""
+        return await self._get_json("maxitem.json")
+    
+    async def get_updates(self) -> List[int]:
+        """Fetch IDs of recently changed items from HN API."""
+        updates = await self._get_json("updates.json")
+        return updates.get('items', []) if updates else []
+    
+    async def get_incremental_item_ids(
+        self,
+        since_max_item: Optional[int],
+        max_items: Optional[int] = None
+    ) -> Tuple[List[int], List[int], int]:
+        """Return item IDs created after ``since_max_item`` and recently updated older ones.
+        
+        At most ``max_items`` new IDs are returned, oldest first, so a large gap
+        is worked off over several runs. The third element is the new high-water
+        mark to persist once those items have been handled.
+        """
+        max_items = max_items or settings.HN_INCREMENTAL_MAX_ITEMS
+        max_item, updated_ids = await asyncio.gather(self.get_max_item(), self.get_updates())
         
-        # Fetch story details concurrently
-        tasks = [self.get_story(story_id) for story_id in story_ids]
-        stories = await asyncio.gather(*tasks, return_exceptions=True)
+        if since_max_item is None:
+            # First run: only look at the most recent window
+            since_max_item = max(max_item - max_items, 0)
         
-        # Filter out failed requests and non-story items
+        high_water_mark = min(max_item, since_max_item + max_items)
+        new_ids = list(range(since_max_item + 1, high_water_mark + 1))
+        
+        updated_ids = [i for i in updated_ids if i <= since_max_item]
+        return new_ids, updated_ids, max(high_water_mark, since_max_item)
+    
+    async def fetch_stories(
+        self,
+        item_ids: List[int],
+        types: Tuple[str, ...] = ('story',)
+    ) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Fetch items concurrently; returns the live stories (or other ``types``) and the IDs that failed."""
+        tasks = [self.get_story(item_id) for item_id in item_ids]
+        items = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Filter out non-story items and deleted/dead stories, keeping failed requests apart
         valid_stories = []
-        for story in stories:
-            if isinstance(story, dict) and story.get('type') == 'story':
+        failed_ids = []
+        for item_id, story in zip(item_ids, items):
+            if isinstance(story, Exception):
+                failed_ids.append(item_id)
+            elif (
+                isinstance(story, dict)
+                and story.get('type') in types
+                and not story.get('deleted')
+                and not story.get('dead')
+            ):
                 # Convert timestamp to datetime
                 if 'time' in story:
-                    story['time'] = datetime.fromtimestamp(story['time'])
+                    story['time'] = from_timestamp(story['time'])
                 valid_stories.append(story)
         
-        return valid_stories
+        return valid_stories, failed_ids
+    
+    async def get_stories(
+        self,
+        item_ids: List[int],
+        types: Tuple[str, ...] = ('story',)
+    ) -> List[Dict[str, Any]]:
+        """Fetch items concurrently and keep only live stories (or other ``types``); failures are dropped."""
+        stories, _ = await self.fetch_stories(item_ids, types)
+        return stories
+    
+    async def crawl_comments(
+        self,
+        story_id: int,
+        max_depth: Optional[int] = None,
+        max_per_depth: Optional[int] = None,
+        max_comments: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Walk a story's comment tree breadth-first, yielding live comments as they arrive.
+        
+        Each level is fetched ``max_concurrency`` items at a time and at most
+        ``max_per_depth`` items are queued per level, so the number of pending
+        requests and the memory held depend on those caps, not on thread size.
+        Yielded comments carry their ``depth`` (1 = top-level).
+        """
+        max_depth = max_depth or settings.COMMENT_MAX_DEPTH
+        max_per_depth = max_per_depth or settings.COMMENT_MAX_PER_DEPTH
+        max_comments = max_comments or settings.COMMENT_MAX_COMMENTS
+        
+        story = await self.get_story(story_id)
+        level = list((story or {}).get('kids') or [])[:max_per_depth]
+        depth = 1
+        yielded = 0
+        
+        while level and depth <= max_depth:
+            next_level = []
+            for start in range(0, len(level), self.max_concurrency):
+                chunk = level[start:start + self.max_concurrency]
+                items = await asyncio.gather(*(self.get_story(item_id) for item_id in chunk), return_exceptions=True)
+                for item in items:
+                    if not isinstance(item, dict) or item.get('type') != 'comment':
+                        continue
+                    # Replies to deleted comments are still live, so queue them either way
+                    room = max_per_depth - len(next_level)
+                    if room > 0:
+                        next_level.extend((item.get('kids') or [])[:room])
+                    if item.get('deleted') or item.get('dead'):
+                        continue
+                    
+                    if 'time' in item:
+                        item['time'] = from_timestamp(item['time'])
+                    item['depth'] = depth
+                    yield item
+                    yielded += 1
+                    if yielded >= max_comments:
+                        return
+            level = next_level
+            depth += 1
+    
+    async def get_top_stories_details(self) -> List[Dict[str, Any]]:
+        """Fetch details for top stories."""
+        story_ids = await self.get_top_stories()
+        return await self.get_stories(story_ids)
     
     def extract_story_data(self, hn_story: Dict[str, Any]) -> Dict[str, Any]:
         """Extract relevant fields from HN story data."""
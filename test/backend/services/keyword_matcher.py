@@ -0,0 +1,74 @@
+"""
+Multi-pattern keyword matching using an Aho-Corasick automaton.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+
+class KeywordMatcher:
+    """Case-insensitive matcher that finds all keywords in a text in one pass.
+    
+    Matches must sit on token boundaries: the characters around a match may not
+    be letters or digits, so "ai" matches "AI tools" but not "said".
+    """
+    
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(keyword.lower() for keyword in keywords if keyword))
+        self._build()
+    
+    def _build(self):
+        """Build the goto, failure and output tables."""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._output: List[List[str]] = [[]]
+        
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(keyword)
+        
+        # Breadth-first pass to compute failure links
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    
+    def find(self, text: str) -> Set[str]:
+        """Return all keywords occurring in ``text`` on token boundaries."""
+        found = set()
+        if not text or not self.keywords:
+            return found
+        
+        text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                start = end - len(keyword) + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end + 1 < len(text) and text[end + 1].isalnum():
+                    continue
+                found.add(keyword)
+        return found
+    
+    def find_many(self, texts: Iterable[str]) -> List[Set[str]]:
+        """Return the keywords found in each of ``texts``, in order."""
+        return [self.find(text) for text in texts] 
\ No newline at end of file
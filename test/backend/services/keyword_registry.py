@@ -0,0 +1,75 @@
+"""
+Registry of the tracked AI keywords, loaded from the ai_keywords table.
+"""
+
+import time
+from typing import FrozenSet, Optional
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..database import crud
+from .keyword_matcher import KeywordMatcher
+
+
+class KeywordRegistry:
+    """Active keywords from the ``ai_keywords`` table, reloaded when they change.
+    
+    Every keyword change bumps a version number in ``sync_state``. Callers
+    pass their session and the registry compares that version at most once
+    per ``refresh_seconds``, so a long-running worker picks up edits without a
+    restart and without re-reading the keyword table per story. The registry
+    owns the one compiled matcher for the current keywords. Until the table
+    has been seeded ``settings.AI_KEYWORDS`` is used; once it holds keywords,
+    disabling all of them means tracking none.
+    """
+    
+    VERSION_STATE = crud.AI_KEYWORDS_VERSION_STATE
+    
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self.refresh_seconds = (
+            settings.KEYWORD_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        )
+        self.version: Optional[int] = None
+        self._keywords: Optional[FrozenSet[str]] = None
+        self._matcher: Optional[KeywordMatcher] = None
+        self._checked_at = 0.0
+    
+    @staticmethod
+    def _normalize(keywords) -> FrozenSet[str]:
+        return frozenset(keyword.strip().lower() for keyword in keywords if keyword and keyword.strip())
+    
+    def keywords(self, db: Optional[Session] = None) -> FrozenSet[str]:
+        """Return the active keywords, checking for changes if a session is given and due."""
+        if db is not None and time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh(db)
+        if self._keywords is None:
+            return self._normalize(settings.AI_KEYWORDS)
+        return self._keywords
+    
+    def matcher(self, db: Optional[Session] = None) -> KeywordMatcher:
+        """Return the compiled matcher for the active keywords, building it on first use."""
+        keywords = self.keywords(db)
+        if self._matcher is None:
+            self._matcher = KeywordMatcher(keywords)
+        return self._matcher
+    
+    def refresh(self, db: Session, force: bool = False) -> bool:
+        """Reload the keywords if their version changed; returns True if reloaded."""
+        self._checked_at = time.monotonic()
+        version = crud.get_sync_state(db, self.VERSION_STATE) or 0
+        if not force and self._keywords is not None and version == self.version:
+            return False
+        
+        rows = crud.get_ai_keywords(db)
+        if rows:
+            keywords = self._normalize(row.keyword for row in rows if row.status == "active")
+        else:
+            keywords = self._normalize(settings.AI_KEYWORDS)
+        if keywords != self.keywords():
+            self._matcher = None
+        self._keywords = keywords
+        self.version = version
+        return True
+
+
+# Shared by every service in the process so the keywords are loaded once
+keyword_registry = KeywordRegistry() 
\ No newline at end of file
@@ -1,16 +1,34 @@
+import os
 import redis
 import json
-from typing import Optional, Callable
+import socket
+import time
+from typing import Any, Optional, Callable, Iterator, List, Tuple
 from ..core.config import settings
 from datetime import datetime
 
 
 class RedisService:
-    """Service for Redis pub/sub operations."""
+    """Service for Redis pub/sub and stream operations.
     
-    def __init__(self):
-        self.redis_client = redis.from_url(settings.REDIS_URL)
+    With ``REDIS_TRANSPORT=streams`` story events go to a Redis Stream consumed
+    through a consumer group, giving at-least-once delivery across several
+    processor replicas. The default ``pubsub`` transport is fire-and-forget.
+    """
+    
+    def __init__(self, redis_client: Optional[redis.Redis] = None, transport: Optional[str] = None):
+        self.redis_client = redis_client or redis.from_url(settings.REDIS_URL)
         self.pubsub = self.redis_client.pubsub()
+        self.transport = transport or settings.REDIS_TRANSPORT
+        self.stream = settings.REDIS_STREAM_NAME
+        self.group = settings.REDIS_CONSUMER_GROUP
+        self.consumer = settings.REDIS_CONSUMER_NAME or f"{socket.gethostname()}-{os.getpid()}"
+        self._claim_cursor = "0-0"
+    
+    @property
+    def uses_streams(self) -> bool:
+        """Whether story events are carried over a Redis Stream."""
+        return self.transport == "streams"
     
     def publish_story_event(self, story_id: int, story_data: dict):
         """Publish a new story event to Redis."""
@@ -19,19 +37,189 @@ class RedisService:
             'story_data': story_data,
             'timestamp': str(datetime.now())
         }
-        self.redis_client.publish('new_story', json.dumps(event_data))
+        if self.uses_streams:
+            self.redis_client.xadd(
+                self.stream,
+                {'data': json.dumps(event_data)},
+                maxlen=settings.REDIS_STREAM_MAXLEN,
+                approximate=True
+            )
+        else:
+            self.redis_client.publish('new_story', json.dumps(event_data))
+    
+    def ensure_consumer_group(self):
+        """Create the stream and consumer group if they do not exist yet."""
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    def _decode_entries(self, entries: List[Tuple[Any, dict]]) -> List[Tuple[str, Optional[dict]]]:
+        """Decode raw stream entries into (entry_id, event) pairs."""
+        decoded = []
+        for entry_id, fields in entries:
+            if isinstance(entry_id, bytes):
+                entry_id = entry_id.decode()
+            raw = fields.get(b'data', fields.get('data')) if fields else None
+            try:
+                event = json.loads(raw) if raw is not None else None
+            except json.JSONDecodeError:
+                print(f"Failed to decode stream entry {entry_id}: {raw}")
+                event = None
+            decoded.append((entry_id, event))
+        return decoded
+    
+    def claim_stale_story_events(self, count: Optional[int] = None) -> List[Tuple[str, Optional[dict]]]:
+        """Take over entries left pending by consumers that stopped acknowledging."""
+        result = self.redis_client.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=settings.REDIS_STREAM_CLAIM_IDLE_MS,
+            start_id=self._claim_cursor,
+            count=count or settings.REDIS_STREAM_BATCH_SIZE
+        )
+        next_cursor, entries = result[0], result[1]
+        self._claim_cursor = next_cursor.decode() if isinstance(next_cursor, bytes) else next_cursor
+        # Entries trimmed from the stream come back without fields
+        return self._decode_entries([entry for entry in entries if entry and entry[1]])
+    
+    def read_story_events(
+        self,
+        count: Optional[int] = None,
+        block_ms: Optional[int] = None
+    ) -> List[Tuple[str, Optional[dict]]]:
+        """Read up to ``count`` new stream entries for this consumer.
+        
+        Entries must be acknowledged with ``ack_story_events`` once handled;
+        unacknowledged ones are redelivered via ``claim_stale_story_events``.
+        """
+        response = self.redis_client.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: ">"},
+            count=count or settings.REDIS_STREAM_BATCH_SIZE,
+            block=block_ms
+        )
+        entries = []
+        for _, stream_entries in response or []:
+            entries.extend(stream_entries)
+        return self._decode_entries(entries)
+    
+    def ack_story_events(self, entry_ids: List[str]):
+        """Acknowledge handled stream entries."""
+        if entry_ids:
+            self.redis_client.xack(self.stream, self.group, *entry_ids)
+    
+    def story_event_batches(
+        self,
+        max_events: Optional[int] = None,
+        max_wait_ms: Optional[int] = None
+    ) -> Iterator[List[dict]]:
+        """Yield micro-batches of story events from either transport.
+        
+        A batch is emitted once ``max_events`` events are buffered or
+        ``max_wait_ms`` has passed since the first buffered event. Stream entries
+        of a batch are acknowledged when the consumer asks for the next batch,
+        unless it sends ``False`` instead; those stay pending and are reclaimed
+        after REDIS_STREAM_CLAIM_IDLE_MS.
+        """
+        max_events = max_events or settings.PROCESSOR_BATCH_SIZE
+        max_wait = (max_wait_ms if max_wait_ms is not None else settings.PROCESSOR_FLUSH_INTERVAL_MS) / 1000
+        
+        if self.uses_streams:
+            self.ensure_consumer_group()
+        else:
+            self.pubsub.subscribe('new_story')
+        
+        while True:
+            entries = self._wait_for_entries(max_events, max_wait)
+            events = [event for _, event in entries if event is not None]
+            handled = True
+            if events:
+                handled = (yield events) is not False
+            if self.uses_streams and handled:
+                self.ack_story_events([entry_id for entry_id, _ in entries])
+    
+    def _wait_for_entries(self, max_events: int, max_wait: float) -> List[Tuple[Optional[str], Optional[dict]]]:
+        """Block for the first entry, then buffer more until the size or time limit."""
+        entries = []
+        deadline = None
+        while len(entries) < max_events:
+            if deadline is None:
+                timeout = settings.REDIS_STREAM_BLOCK_MS / 1000
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            
+            if self.uses_streams:
+                if not entries:
+                    entries += self.claim_stale_story_events(count=max_events)
+                entries += self.read_story_events(
+                    count=max_events - len(entries),
+                    block_ms=max(int(timeout * 1000), 1)
+                )
+            else:
+                message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                if message and message['type'] == 'message':
+                    try:
+                        entries.append((None, json.loads(message['data'])))
+                    except json.JSONDecodeError:
+                        print(f"Failed to decode message: {message['data']}")
+            
+            if deadline is None:
+                if not entries:
+                    return entries
+                deadline = time.monotonic() + max_wait
+        return entries
+    
+    def consume_story_events(
+        self,
+        handler: Callable[[List[dict]], None],
+        max_events: Optional[int] = None,
+        max_wait_ms: Optional[int] = None
+    ):
+        """Pass micro-batches of story events to ``handler`` until interrupted.
+        
+        A batch whose handler raises is logged and left unacknowledged.
+        """
+        batches = self.story_event_batches(max_events, max_wait_ms)
+        events = next(batches)
+        while True:
+            try:
+                handler(events)
+                handled = True
+            except Exception as e:
+                print(f"Failed to handle {len(events)} story events, leaving them pending: {e}")
+                handled = False
+            events = batches.send(handled)
     
     def subscribe_to_stories(self, callback: Callable[[dict], None]):
         """Subscribe to new story events."""
+        if self.uses_streams:
+            def handle_batch(events: List[dict]):
+                for event in events:
+                    callback(event)
+            
+            self.consume_story_events(handle_batch)
+            return
+        
         self.pubsub.subscribe('new_story')
         
         for message in self.pubsub.listen():
             if message['type'] == 'message':
                 try:
                     data = json.loads(message['data'])
-                    callback(data)
                 except json.JSONDecodeError:
                     print(f"Failed to decode message: {message['data']}")
+                    continue
+                try:
+                    callback(data)
+                except Exception as e:
+                    # Pub/sub cannot redeliver; log and keep listening
+                    print(f"Failed to handle story event: {e}")
     
     def get_story_event(self) -> Optional[dict]:
         """Get a single story event (non-blocking)."""
@@ -5,16 +5,71 @@ Story-related background tasks.
 from celery import current_task
 from sqlalchemy.orm import Session
 from ..core.celery_app import celery_app
+from ..core.config import settings
 from ..database.database import SessionLocal
 from ..services.hn_service import HackerNewsService
 from ..services.analytics_service import AnalyticsService
+from ..services.backfill_service import BackfillService
+from ..services.cache_service import CacheService
 from ..database import crud
+from ..core.utils import from_timestamp, utcnow
 import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+
+def _batches(items: list, size: int):
+    """Yield successive slices of ``items`` of at most ``size`` elements."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _store_batch(
+    db: Session,
+    analytics_service: AnalyticsService,
+    batch: list,
+    update_existing: bool = False
+) -> Optional[set]:
+    """Upsert a batch of stories and apply their analytics in one transaction.
+    
+    Returns the IDs of newly inserted stories; only those count towards analytics.
+    A batch that cannot be stored is rolled back and None is returned.
+    """
+    try:
+        new_ids = crud.bulk_upsert_stories(db, batch, update_existing=update_existing, commit=False)
+        new_stories = [story_data for story_data in batch if story_data['id'] in new_ids]
+        analytics_service.process_stories(db, new_stories)
+        return new_ids
+    except Exception as e:
+        db.rollback()
+        print(f"Error storing batch of {len(batch)} stories: {e}")
+        return None
+
+
+async def _fetch_new_feed_stories(hn_service: HackerNewsService, db: Session, feeds: list):
+    """Read the feeds concurrently and fetch each unknown item once, however many feeds list it.
+    
+    Returns the ranked IDs per feed, the merged set of IDs and the new stories.
+    """
+    async with hn_service:
+        feed_ids = await hn_service.get_feeds(feeds)
+        story_ids = set().union(*feed_ids.values())
+        existing_ids = crud.get_existing_story_ids(db, list(story_ids))
+        missing_ids = sorted(story_ids - existing_ids)
+        # Job postings are their own item type; keep them (out of analytics) only when the job feed is read
+        types = ('story', 'job') if 'job' in feed_ids else ('story',)
+        stories = await hn_service.get_stories(missing_ids, types)
+    return feed_ids, story_ids, stories
 
 
 @celery_app.task(bind=True)
 def fetch_and_process_stories(self):
-    """Fetch top stories from HN and process them for analytics."""
+    """Fetch the stories on the configured HN feeds and process them for analytics.
+    
+    Feeds overlap heavily, so their IDs are merged first and every unique item
+    is fetched at most once per run. Each feed's current ranks are then stored
+    in ``feed_memberships``.
+    """
     try:
         # Update task state
         self.update_state(state="PROGRESS", meta={"status": "Fetching stories from HN API"})
@@ -27,54 +82,278 @@ def fetch_and_process_stories(self):
         db = SessionLocal()
         
         try:
-            # Fetch top stories
-            story_ids = asyncio.run(hn_service.get_top_stories())
-            self.update_state(state="PROGRESS", meta={"status": f"Fetched {len(story_ids)} story IDs"})
+            # Fetch all new stories in a single event loop with a shared client
+            feed_ids, story_ids, stories_data = asyncio.run(
+                _fetch_new_feed_stories(hn_service, db, settings.HN_FEEDS)
+            )
+            self.update_state(
+                state="PROGRESS",
+                meta={"status": f"Fetched {len(stories_data)} new of {len(story_ids)} stories"}
+            )
             
             processed_count = 0
-            for i, story_id in enumerate(story_ids):
-                try:
-                    # Check if story already exists
-                    existing_story = crud.get_story(db, story_id)
-                    if existing_story:
-                        continue
-                    
-                    # Fetch story details
-                    story_data = asyncio.run(hn_service.get_story(story_id))
-                    
-                    if not story_data or story_data.get('type') != 'story':
-                        continue
-                    
-                    # Debug: Print story data structure
-                    print(f"Processing story {story_id}: {story_data.get('title', 'No title')}")
-                    print(f"Story data keys: {list(story_data.keys())}")
-                    
-                    # Create story in database
-                    story = crud.create_story_from_dict(db, story_data)
-                    
-                    # Process for analytics
-                    analytics_service.process_story(db, story)
-                    
-                    processed_count += 1
-                    
-                    # Update progress
-                    progress = int((i + 1) / len(story_ids) * 100)
-                    self.update_state(
-                        state="PROGRESS", 
-                        meta={
-                            "status": f"Processed {processed_count} new stories",
-                            "progress": progress
-                        }
-                    )
-                    
-                except Exception as e:
-                    print(f"Error processing story {story_id}: {e}")
-                    continue
+            for batch in _batches(stories_data, settings.INGEST_BATCH_SIZE):
+                # Persist the batch and its analytics in one transaction
+                processed_count += len(_store_batch(db, analytics_service, batch) or ())
+                
+                # Update progress
+                progress = int(processed_count / len(stories_data) * 100)
+                self.update_state(
+                    state="PROGRESS", 
+                    meta={
+                        "status": f"Processed {processed_count} new stories",
+                        "progress": progress
+                    }
+                )
+            
+            membership_count = crud.replace_feed_memberships(db, feed_ids, utcnow())
+            if processed_count or membership_count:
+                CacheService().invalidate()
             
             return {
                 "status": "SUCCESS",
                 "processed_count": processed_count,
-                "total_stories": len(story_ids)
+                "total_stories": len(story_ids),
+                "feeds": {feed: len(ids) for feed, ids in feed_ids.items()}
+            }
+            
+        finally:
+            db.close()
+            
+    except Exception as e:
+        self.update_state(state="FAILURE", meta={"error": str(e)})
+        raise
+
+
+MAX_ITEM_STATE = "hn_max_item"
+
+
+def _cap_high_water_mark(high_water_mark: int, new_ids: List[int], failed_ids: List[int]) -> int:
+    """Keep the mark just below the lowest new item that failed.
+    
+    That item and everything after it is then fetched again on the next run.
+    """
+    failed_new_ids = set(failed_ids).intersection(new_ids)
+    if failed_new_ids:
+        return min(high_water_mark, min(failed_new_ids) - 1)
+    return high_water_mark
+
+
+async def _fetch_incremental_items(hn_service: HackerNewsService, since_max_item):
+    """Fetch new and recently updated stories in a single event loop.
+    
+    Returns the stories, the new item IDs, the high-water mark to persist and
+    the IDs whose fetch failed; the mark is capped below failed new items.
+    """
+    async with hn_service:
+        new_ids, updated_ids, high_water_mark = await hn_service.get_incremental_item_ids(since_max_item)
+        stories, failed_ids = await hn_service.fetch_stories(new_ids + updated_ids)
+    return stories, new_ids, _cap_high_water_mark(high_water_mark, new_ids, failed_ids), failed_ids
+
+
+@celery_app.task(bind=True)
+def fetch_incremental_stories(self):
+    """Fetch only items created or changed since the last run.
+    
+    Uses HN's maxitem.json as a persisted high-water mark and updates.json for
+    changed items, so the work per run follows the rate of change on HN.
+    """
+    try:
+        self.update_state(state="PROGRESS", meta={"status": "Fetching new and updated items"})
+        
+        hn_service = HackerNewsService()
+        analytics_service = AnalyticsService()
+        db = SessionLocal()
+        
+        try:
+            since_max_item = crud.get_sync_state(db, MAX_ITEM_STATE)
+            stories, new_item_ids, high_water_mark, failed_ids = asyncio.run(
+                _fetch_incremental_items(hn_service, since_max_item)
+            )
+            
+            new_count = 0
+            updated_count = 0
+            unstored_ids = []
+            for batch in _batches(stories, settings.INGEST_BATCH_SIZE):
+                # New stories are inserted, known ones get fresh score/comments
+                new_ids = _store_batch(db, analytics_service, batch, update_existing=True)
+                if new_ids is None:
+                    unstored_ids.extend(story_data['id'] for story_data in batch)
+                    continue
+                new_count += len(new_ids)
+                updated_count += len(batch) - len(new_ids)
+            
+            # New items of batches that could not be stored are fetched again next run
+            high_water_mark = _cap_high_water_mark(high_water_mark, new_item_ids, unstored_ids)
+            crud.set_sync_state(db, MAX_ITEM_STATE, high_water_mark)
+            if stories:
+                CacheService().invalidate()
+            
+            return {
+                "status": "SUCCESS",
+                "new_count": new_count,
+                "updated_count": updated_count,
+                "failed_count": len(failed_ids),
+                "unstored_count": len(unstored_ids),
+                "max_item": high_water_mark
+            }
+            
+        finally:
+            db.close()
+            
+    except Exception as e:
+        self.update_state(state="FAILURE", meta={"error": str(e)})
+        raise
+
+
+def _refresh_interval(age_hours: float, on_front_page: bool) -> float:
+    """Seconds between re-polls of a story: short while new, doubling as it ages."""
+    if on_front_page:
+        return settings.REFRESH_MIN_INTERVAL_SECONDS
+    return settings.REFRESH_MIN_INTERVAL_SECONDS * 2 ** (age_hours / settings.REFRESH_INTERVAL_DOUBLING_HOURS)
+
+
+def _stories_due_for_refresh(candidates: list, front_page_ids: set, now: datetime) -> list:
+    """Return IDs of candidates whose refresh interval has elapsed, most overdue first."""
+    due = []
+    for story in candidates:
+        last_polled = story.refreshed_at or story.fetched_at
+        if last_polled is None:
+            due.append((float("inf"), story.id))
+            continue
+        age_hours = max((now - story.time).total_seconds(), 0) / 3600
+        interval = _refresh_interval(age_hours, story.id in front_page_ids)
+        overdue = (now - last_polled).total_seconds() / interval
+        if overdue >= 1:
+            due.append((overdue, story.id))
+    due.sort(reverse=True)
+    return [story_id for _, story_id in due[:settings.REFRESH_MAX_STORIES]]
+
+
+async def _poll_active_stories(hn_service: HackerNewsService, db: Session, now: datetime):
+    """Pick the active stories due for a re-poll and fetch them concurrently."""
+    async with hn_service:
+        front_page_ids = await hn_service.get_top_stories()
+        since = now - timedelta(hours=settings.REFRESH_MAX_AGE_HOURS)
+        candidates = crud.get_refresh_candidates(db, since, front_page_ids)
+        due_ids = _stories_due_for_refresh(candidates, set(front_page_ids), now)
+        stories = await hn_service.get_stories(due_ids)
+    return candidates, due_ids, stories
+
+
+@celery_app.task(bind=True)
+def refresh_story_scores(self):
+    """Re-poll score and comment counts of recent and front-page stories.
+    
+    Stories are re-polled every REFRESH_MIN_INTERVAL_SECONDS while new or on
+    the front page, and less often as they age; the results are written with
+    one bulk UPDATE.
+    """
+    try:
+        self.update_state(state="PROGRESS", meta={"status": "Refreshing active stories"})
+        
+        hn_service = HackerNewsService()
+        db = SessionLocal()
+        
+        try:
+            # Compared with fetched_at and stored as refreshed_at, so read the database clock
+            now = crud.get_db_now(db)
+            candidates, due_ids, stories = asyncio.run(_poll_active_stories(hn_service, db, now))
+            
+            current = {story.id: (story.score, story.descendants) for story in candidates}
+            fresh = {
+                story['id']: (story.get('score', 0), story.get('descendants', 0))
+                for story in stories
+            }
+            changed = sum(1 for story_id, values in fresh.items() if current.get(story_id) != values)
+            
+            # Dead, deleted or failed items keep their values but still count as polled
+            stats = {story_id: current[story_id] for story_id in due_ids}
+            stats.update(fresh)
+            crud.update_story_stats(db, stats, now)
+            if changed:
+                CacheService().invalidate()
+            
+            return {
+                "status": "SUCCESS",
+                "active_count": len(candidates),
+                "refreshed_count": len(fresh),
+                "changed_count": changed
+            }
+            
+        finally:
+            db.close()
+            
+    except Exception as e:
+        self.update_state(state="FAILURE", meta={"error": str(e)})
+        raise
+
+
+def _store_comment_batch(
+    db: Session,
+    analytics_service: AnalyticsService,
+    story_id: int,
+    batch: list
+) -> int:
+    """Store a batch of crawled comments and count keywords in the new ones."""
+    try:
+        new_ids = crud.bulk_upsert_comments(db, story_id, batch)
+        new_comments = [comment for comment in batch if comment['id'] in new_ids]
+        analytics_service.process_comments(db, story_id, new_comments)
+        return len(new_ids)
+    except Exception as e:
+        db.rollback()
+        print(f"Error storing batch of {len(batch)} comments for story {story_id}: {e}")
+        return 0
+
+
+async def _crawl_and_store_comments(
+    hn_service: HackerNewsService,
+    db: Session,
+    analytics_service: AnalyticsService,
+    story_id: int
+):
+    """Stream a story's comments from the crawler into the database in batches."""
+    crawled = 0
+    stored = 0
+    batch = []
+    async with hn_service:
+        async for comment in hn_service.crawl_comments(story_id):
+            crawled += 1
+            batch.append(comment)
+            if len(batch) >= settings.COMMENT_BATCH_SIZE:
+                stored += _store_comment_batch(db, analytics_service, story_id, batch)
+                batch = []
+    if batch:
+        stored += _store_comment_batch(db, analytics_service, story_id, batch)
+    return crawled, stored
+
+
+@celery_app.task(bind=True)
+def crawl_story_comments(self, story_id: int):
+    """Crawl a stored story's comment tree and count keyword mentions in it."""
+    try:
+        self.update_state(state="PROGRESS", meta={"status": f"Crawling comments of story {story_id}"})
+        
+        hn_service = HackerNewsService()
+        analytics_service = AnalyticsService()
+        db = SessionLocal()
+        
+        try:
+            if not crud.get_story(db, story_id):
+                return {"status": "FAILURE", "error": "Story not found", "story_id": story_id}
+            
+            crawled, stored = asyncio.run(
+                _crawl_and_store_comments(hn_service, db, analytics_service, story_id)
+            )
+            if stored:
+                CacheService().invalidate()
+            
+            return {
+                "status": "SUCCESS",
+                "story_id": story_id,
+                "crawled_count": crawled,
+                "new_count": stored
             }
             
         finally:
@@ -85,6 +364,59 @@ def fetch_and_process_stories(self):
         raise
 
 
+@celery_app.task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=settings.BACKFILL_MAX_RETRIES
+)
+def backfill_stories(self, shard: Optional[int] = None):
+    """Walk a planned historical backfill for BACKFILL_TASK_CHUNKS chunks, then re-queue.
+    
+    With ``shard`` only that ID range is walked, so one task per shard spreads
+    the backfill over the workers. Progress is checkpointed per chunk, and each
+    task stays well under the time limit by handing the rest to a fresh task.
+    A failed run (e.g. items HN did not serve) is retried with exponential
+    backoff from the checkpoints. The plan must exist (``main.py backfill
+    --celery`` creates it).
+    """
+    try:
+        self.update_state(state="PROGRESS", meta={"status": "Backfilling stories", "shard": shard})
+        
+        backfill_service = BackfillService()
+        db = SessionLocal()
+        
+        try:
+            def report(shard_done, next_id, progress):
+                self.update_state(
+                    state="PROGRESS",
+                    meta={"status": f"Shard {shard_done} at item {next_id}", **progress.as_dict()}
+                )
+            
+            shards = None if shard is None else [shard]
+            progress = asyncio.run(backfill_service.run(
+                db, shards=shards, max_chunks=settings.BACKFILL_TASK_CHUNKS, on_chunk=report
+            ))
+            if progress.new_stories:
+                CacheService().invalidate()
+            
+            remaining = [
+                next_id for pending, next_id, _ in backfill_service.remaining(db)
+                if shard is None or pending == shard
+            ]
+            if remaining:
+                backfill_stories.delay(shard)
+            
+            return {"status": "SUCCESS", "shard": shard, "done": not remaining, **progress.as_dict()}
+            
+        finally:
+            db.close()
+            
+    except Exception as e:
+        self.update_state(state="FAILURE", meta={"error": str(e)})
+        raise
+
+
 @celery_app.task
 def process_story_analytics(story_id: int, story_data: dict):
     """Process a single story for analytics."""
@@ -102,6 +434,7 @@ def process_story_analytics(story_id: int, story_data: dict):
             
             # Process analytics
             analytics_service.process_story(db, story)
+            CacheService().invalidate()
             
             return {"status": "SUCCESS", "story_id": story_id}
             
@@ -113,16 +446,56 @@ def process_story_analytics(story_id: int, story_data: dict):
         return {"status": "FAILURE", "error": str(e), "story_id": story_id}
 
 
+SNAPSHOT_DAILY_STATE = "snapshots_daily_before"
+
+
+def _downsample_snapshots(db: Session, now: datetime) -> int:
+    """Thin out score history: hourly after a day, daily after a week.
+    
+    The daily pass starts at the day the previous run stopped in, kept as a
+    watermark (epoch seconds) in ``sync_state``, so old history is not
+    rescanned every run. Returns the number of snapshots removed.
+    """
+    hourly_since = now - timedelta(hours=settings.SNAPSHOT_FULL_RESOLUTION_HOURS)
+    daily_since = now - timedelta(days=settings.SNAPSHOT_HOURLY_DAYS)
+    removed = crud.downsample_story_snapshots(db, 'hour', hourly_since, after=daily_since)
+    
+    watermark = crud.get_sync_state(db, SNAPSHOT_DAILY_STATE)
+    after = None
+    if watermark is not None:
+        # That day was cut short last time, so it is thinned out again in full
+        after = from_timestamp(watermark).replace(hour=0, minute=0, second=0, microsecond=0)
+    removed += crud.downsample_story_snapshots(db, 'day', daily_since, after=after)
+    crud.set_sync_state(db, SNAPSHOT_DAILY_STATE, int(daily_since.replace(tzinfo=timezone.utc).timestamp()))
+    return removed
+
+
 @celery_app.task
 def update_analytics_summary():
-    """Update analytics summary tables."""
+    """Update the daily rollups, prune trend buckets and downsample score history."""
     try:
         db = SessionLocal()
         
         try:
-            # This could include aggregating data, cleaning old records, etc.
-            # For now, just return success
-            return {"status": "SUCCESS", "message": "Analytics summary updated"}
+            # Roll up stories stored since the last run into the daily tables
+            rollups = AnalyticsService().update_daily_rollups(db)
+            if rollups["days_updated"]:
+                CacheService().invalidate()
+            
+            # Drop trend buckets past the retention period
+            now = utcnow()
+            cutoff = now - timedelta(days=settings.TREND_RETENTION_DAYS)
+            pruned = crud.prune_trend_buckets(db, cutoff)
+            
+            downsampled = _downsample_snapshots(db, crud.get_db_now(db))
+            
+            return {
+                "status": "SUCCESS",
+                "message": "Analytics summary updated",
+                "days_updated": rollups["days_updated"],
+                "pruned_trend_buckets": pruned,
+                "downsampled_snapshots": downsampled
+            }
             
         finally:
             db.close()
@@ -4,10 +4,13 @@ Background processor for handling Redis events.
 
 import json
 import time
+from typing import List
 from sqlalchemy.orm import Session
+from ..core.config import settings
 from ..database.database import SessionLocal
 from ..services.redis_service import RedisService
 from ..services.analytics_service import AnalyticsService
+from ..services.cache_service import CacheService
 from ..database import crud
 
 
@@ -17,36 +20,53 @@ class BackgroundProcessor:
     def __init__(self):
         self.redis_service = RedisService()
         self.analytics_service = AnalyticsService()
+        self.cache_service = CacheService()
     
     def process_story_event(self, event_data: dict):
         """Process a story event from Redis."""
+        self.process_story_events([event_data])
+    
+    def process_story_events(self, events: List[dict]):
+        """Process a micro-batch of story events in one DB session and transaction.
+        
+        Errors are re-raised so the batch is not acknowledged and gets redelivered;
+        stories that were already analyzed are skipped on redelivery.
+        """
         try:
-            story_id = event_data.get('story_id')
-            story_data = event_data.get('story_data')
+            story_ids = []
+            for event_data in events:
+                story_id = event_data.get('story_id')
+                if not story_id or not event_data.get('story_data'):
+                    print(f"Invalid event data: {event_data}")
+                    continue
+                story_ids.append(story_id)
             
-            if not story_id or not story_data:
-                print(f"Invalid event data: {event_data}")
+            if not story_ids:
                 return
             
             # Get database session
             db = SessionLocal()
             try:
-                # Get the story from database
-                story = crud.get_story(db, story_id)
-                if not story:
+                # Load every referenced story with one IN query
+                stories = crud.get_stories_by_ids(db, story_ids)
+                missing_ids = set(story_ids) - {story.id for story in stories}
+                for story_id in missing_ids:
                     print(f"Story {story_id} not found in database")
-                    return
                 
-                # Process story for analytics
-                result = self.analytics_service.process_story(db, story)
+                # Process stories for analytics in a single transaction
+                results = self.analytics_service.process_stories(db, stories)
+                if results:
+                    self.cache_service.invalidate()
                 
-                print(f"Processed story {story_id}: {result['keywords']} keywords, domain: {result['domain']}")
+                for result in results:
+                    print(f"Processed story {result['story_id']}: {result['keywords']} keywords, domain: {result['domain']}")
                 
             finally:
                 db.close()
                 
         except Exception as e:
-            print(f"Error processing story event: {e}")
+            print(f"Error processing story events: {e}")
+            raise
     
     def run(self):
         """Run the background processor."""
@@ -54,8 +74,16 @@ class BackgroundProcessor:
         print("Subscribing to Redis events...")
         
         try:
-            # Subscribe to story events
-            self.redis_service.subscribe_to_stories(self.process_story_event)
+            if settings.PROCESSOR_BATCH_SIZE > 1:
+                # Flush after N events or T milliseconds, whichever comes first
+                self.redis_service.consume_story_events(
+                    self.process_story_events,
+                    max_events=settings.PROCESSOR_BATCH_SIZE,
+                    max_wait_ms=settings.PROCESSOR_FLUSH_INTERVAL_MS
+                )
+            else:
+                # Subscribe to story events
+                self.redis_service.subscribe_to_stories(self.process_story_event)
         except KeyboardInterrupt:
             print("Shutting down background processor...")
         finally:
@@ -63,6 +91,16 @@ class BackgroundProcessor:
     
     def run_once(self):
         """Process a single event (for testing)."""
+        if self.redis_service.uses_streams:
+            self.redis_service.ensure_consumer_group()
+            entries = self.redis_service.read_story_events(count=1)
+            for _, event in entries:
+                if event:
+                    self.process_story_event(event)
+            # Only reached if processing succeeded; failed entries stay pending
+            self.redis_service.ack_story_events([entry_id for entry_id, _ in entries])
+            return bool(entries)
+        
         event = self.redis_service.get_story_event()
         if event:
             self.process_story_event(event)
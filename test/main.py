@@ -4,18 +4,21 @@ Main entry point for the Hacker News Analytics Dashboard Backend.
 """
 
 import sys
+import time
 import argparse
 import uvicorn
 from backend.api import app
 from backend.workers.background_processor import BackgroundProcessor
 from backend.database.database import engine
-from backend.database.models import Base
+from backend.database.models import Base, add_missing_columns, create_indexes
 
 
 def create_tables():
     """Create database tables and populate AI keywords."""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    create_indexes(engine)
     print("Database tables created successfully!")
 
     # Populate AI keywords table
@@ -33,6 +36,108 @@ def create_tables():
     session.close()
     print("AI keywords table populated!")
 
+    # Seed the maintained row counts from the current table contents
+    from backend.database.crud import refresh_table_counts
+    session = SessionLocal()
+    try:
+        print(f"Row counts: {refresh_table_counts(session)}")
+    finally:
+        session.close()
+
+
+def backfill_story_keywords():
+    """Record story keyword matches for stories ingested before they were tracked."""
+    from backend.database.database import SessionLocal
+    from backend.services.analytics_service import AnalyticsService
+    print("Backfilling story keywords...")
+    session = SessionLocal()
+    try:
+        processed = AnalyticsService().backfill_story_associations(session)
+    finally:
+        session.close()
+    print(f"Backfilled {processed} stories!")
+
+
+def backfill_story_domains():
+    """Store the normalized domain on stories ingested before it was persisted."""
+    from backend.database.database import SessionLocal
+    from backend.database.crud import backfill_story_domains as backfill
+    print("Backfilling story domains...")
+    session = SessionLocal()
+    try:
+        updated = backfill(session)
+    finally:
+        session.close()
+    print(f"Backfilled domains for {updated} stories!")
+
+
+def rebuild_analytics(batch_size: int = None, workers: int = None):
+    """Recompute keyword and domain analytics from all stored stories."""
+    from backend.database.database import SessionLocal
+    from backend.services.analytics_service import AnalyticsService
+    from backend.services.cache_service import CacheService
+    print("Rebuilding analytics...")
+    session = SessionLocal()
+    started = time.monotonic()
+    try:
+        result = AnalyticsService().rebuild_analytics(session, batch_size=batch_size, workers=workers)
+    finally:
+        session.close()
+    CacheService().invalidate()
+    print(f"Rebuilt analytics from {result['stories']} stories "
+          f"({result['keywords']} keywords, {result['domains']} domains) "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+def backfill(
+    shards: int = None,
+    chunk_size: int = None,
+    concurrency: int = None,
+    min_item: int = 1,
+    use_celery: bool = False,
+    restart: bool = False
+):
+    """Walk HN item IDs down from maxitem and store the stories, resuming from the checkpoint."""
+    import asyncio
+    from backend.database.database import SessionLocal
+    from backend.services.backfill_service import BackfillService
+    from backend.services.cache_service import CacheService
+    from backend.services.hn_service import HackerNewsService
+    session = SessionLocal()
+    service = BackfillService(HackerNewsService(max_concurrency=concurrency), chunk_size=chunk_size)
+    try:
+        if asyncio.run(service.start(session, shards, min_item, restart)):
+            print("Planned a new backfill from the current maxitem")
+        remaining = service.remaining(session)
+        if not remaining:
+            print("Backfill already complete (use --restart to start over)")
+            return
+        left = sum(next_id - low + 1 for _, next_id, low in remaining)
+        print(f"Backfilling {left} items in {len(remaining)} shards...")
+
+        if use_celery:
+            from backend.tasks.story_tasks import backfill_stories
+            for shard, _, _ in remaining:
+                task = backfill_stories.delay(shard)
+                print(f"Queued shard {shard} as task {task.id}")
+            return
+
+        def report(shard, next_id, progress):
+            print(f"Shard {shard} at item {next_id}: {progress.items} items scanned, "
+                  f"{progress.new_stories} new stories, {progress.items_per_second:.0f} items/s")
+
+        try:
+            progress = asyncio.run(service.run(session, on_chunk=report))
+        except KeyboardInterrupt:
+            print("Interrupted; run backfill again to resume from the last checkpoint")
+            return
+        finally:
+            CacheService().invalidate()
+        print(f"Backfill complete: {progress.items} items, {progress.stories} stories "
+              f"({progress.new_stories} new) at {progress.items_per_second:.0f} items/s")
+    finally:
+        session.close()
+
 
 def run_api_server(host: str = "0.0.0.0", port: int = 8000, reload: bool = False):
     """Run the FastAPI server."""
@@ -66,12 +171,21 @@ def main():
     parser = argparse.ArgumentParser(description="Hacker News Analytics Dashboard Backend")
     parser.add_argument(
         "command",
-        choices=["api", "processor", "create-tables", "celery-worker", "celery-beat"],
+        choices=["api", "processor", "create-tables", "backfill-story-keywords",
+                 "backfill-domains", "rebuild-analytics", "backfill", "celery-worker", "celery-beat"],
         help="Command to run"
     )
     parser.add_argument("--host", default="0.0.0.0", help="Host for API server")
     parser.add_argument("--port", type=int, default=8000, help="Port for API server")
     parser.add_argument("--reload", action="store_true", help="Enable auto-reload for API server")
+    parser.add_argument("--batch-size", type=int, help="Stories per batch for rebuild-analytics")
+    parser.add_argument("--workers", type=int, help="Keyword matching processes for rebuild-analytics")
+    parser.add_argument("--shards", type=int, help="ID ranges walked concurrently by a new backfill")
+    parser.add_argument("--chunk-size", type=int, help="Item IDs per checkpointed backfill chunk")
+    parser.add_argument("--concurrency", type=int, help="Max in-flight HN item requests for backfill")
+    parser.add_argument("--min-item", type=int, default=1, help="Lowest item ID a new backfill walks down to")
+    parser.add_argument("--celery", action="store_true", help="Run backfill shards as Celery tasks")
+    parser.add_argument("--restart", action="store_true", help="Discard the backfill checkpoint and start over")
     
     args = parser.parse_args()
     
@@ -81,6 +195,14 @@ def main():
         run_background_processor()
     elif args.command == "create-tables":
         create_tables()
+    elif args.command == "backfill-story-keywords":
+        backfill_story_keywords()
+    elif args.command == "backfill-domains":
+        backfill_story_domains()
+    elif args.command == "rebuild-analytics":
+        rebuild_analytics(args.batch_size, args.workers)
+    elif args.command == "backfill":
+        backfill(args.shards, args.chunk_size, args.concurrency, args.min_item, args.celery, args.restart)
     elif args.command == "celery-worker":
         run_celery_worker()
     elif args.command == "celery-beat":
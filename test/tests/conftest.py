@@ -6,7 +6,11 @@ import pytest
 import pytest_asyncio
 import asyncio
 from httpx import AsyncClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from backend.api.app import app
+from backend.database.models import Base
 
 
 @pytest.fixture
@@ -24,6 +28,21 @@ async def client():
         yield client
 
 
+@pytest.fixture
+def db_session():
+    """Create an isolated in-memory SQLite session with all tables."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    # Enforce foreign keys like PostgreSQL does
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
 @pytest.fixture
 def sample_story():
     """Sample story data for testing."""
@@ -5,8 +5,18 @@ Pytest-compatible test file for backend functionality.
 
 import pytest
 import httpx
+from datetime import datetime, timedelta
 from backend.services.hn_service import HackerNewsService
-from backend.services.analytics_service import AnalyticsService
+from backend.services.analytics_service import AnalyticsService, AnalyticsDeltas
+from backend.services.keyword_matcher import KeywordMatcher
+from backend.services.redis_service import RedisService
+from backend.services.cache_service import CacheService
+from backend.services.keyword_registry import KeywordRegistry
+from backend.database import crud, models
+from backend.core.config import settings
+from backend.core.utils import utcnow
+from backend.api.app import app
+from backend.database.database import get_db
 
 
 @pytest.mark.asyncio
@@ -51,4 +61,762 @@ async def test_api_endpoints(client):
     
     # Test health endpoint
     response = await client.get("/health")
-    assert response.status_code == 200, f"Health endpoint should return 200, got {response.status_code}" 
\ No newline at end of file
+    assert response.status_code == 200, f"Health endpoint should return 200, got {response.status_code}"
+
+
+def test_bulk_upsert_stories(db_session, sample_story):
+    """Test batched story upsert."""
+    rows = [dict(sample_story, id=sample_story['id'] + i) for i in range(3)]
+    new_ids = crud.bulk_upsert_stories(db_session, rows)
+    assert new_ids == {12345, 12346, 12347}, f"Should insert all rows, got {new_ids}"
+    
+    # Re-upserting known IDs inserts nothing and refreshes stats on request
+    rows = [dict(sample_story, id=12345, score=500), dict(sample_story, id=12348)]
+    new_ids = crud.bulk_upsert_stories(db_session, rows, update_existing=True)
+    assert new_ids == {12348}, f"Only the unseen story should be new, got {new_ids}"
+    
+    story = crud.get_story(db_session, 12345)
+    assert story.score == 500, "Existing story score should be updated"
+    assert story.author == "test_user", "Author should be mapped from 'by'"
+
+
+def test_analytics_deltas_upsert(db_session):
+    """Test batched keyword and domain counter increments."""
+    analytics_service = AnalyticsService()
+    
+    for _ in range(2):
+        deltas = AnalyticsDeltas()
+        analytics_service.collect(deltas, "Claude beats ChatGPT", "https://www.anthropic.com/news")
+        analytics_service.collect(deltas, "Claude 3 released", "https://anthropic.com/claude")
+        analytics_service.apply_deltas(db_session, deltas)
+    
+    counts = {a.keyword: a.count for a in crud.get_analytics(db_session)}
+    assert counts['claude'] == 4, f"Claude should be counted 4 times, got {counts}"
+    assert counts['chatgpt'] == 2, f"ChatGPT should be counted twice, got {counts}"
+    
+    domains = {d.domain: d.count for d in crud.get_domains(db_session)}
+    assert domains == {'anthropic.com': 4}, f"Unexpected domain counts: {domains}"
+
+
+def test_keyword_matcher_boundaries():
+    """Test that keywords only match on token boundaries."""
+    matcher = KeywordMatcher(["AI", "ML", "GPT-4", "Google AI"])
+    
+    assert matcher.find("He said HTML is fine") == set(), "Should not match inside words"
+    assert matcher.find("GPT-4 vs Google AI (ML)") == {"gpt-4", "google ai", "ai", "ml"}
+    assert matcher.find_many(["AI news", "Rust news"]) == [{"ai"}, set()]
+
+
+def test_process_stories_batch(db_session, sample_story):
+    """Test batch analytics over raw story dicts and ORM stories."""
+    analytics_service = AnalyticsService()
+    crud.bulk_upsert_stories(db_session, [sample_story])
+    stories = [
+        crud.get_story(db_session, sample_story['id']),
+        {"id": 1, "title": "Show HN: A Rust web server", "url": None},
+    ]
+    
+    results = analytics_service.process_stories(db_session, stories)
+    assert [r['story_id'] for r in results] == [12345, 1], "Should return one result per story"
+    assert set(results[0]['keywords']) == {"chatgpt", "claude", "ai"}
+    assert results[1]['domain'] == "unknown"
+    assert crud.get_analytics_count(db_session) == 3, "Deltas should be written in one batch"
+
+
+def test_redis_streams_transport(monkeypatch):
+    """Test stream publish, group reads, acks and reclaiming of pending entries."""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    producer = RedisService(redis_client=client, transport="streams")
+    worker_a = RedisService(redis_client=client, transport="streams")
+    worker_b = RedisService(redis_client=client, transport="streams")
+    worker_a.consumer, worker_b.consumer = "worker-a", "worker-b"
+    worker_a.ensure_consumer_group()
+    
+    for story_id in range(3):
+        producer.publish_story_event(story_id, {"id": story_id})
+    
+    entries = worker_a.read_story_events(count=2)
+    assert [event['story_id'] for _, event in entries] == [0, 1], "Should read a batch of entries"
+    worker_a.ack_story_events([entries[0][0]])
+    
+    # Worker A "crashes" before acking entry 1; worker B reclaims it
+    monkeypatch.setattr(settings, "REDIS_STREAM_CLAIM_IDLE_MS", 0)
+    reclaimed = worker_b.claim_stale_story_events()
+    assert [event['story_id'] for _, event in reclaimed] == [1], "Unacked entry should be reclaimed"
+    
+    remaining = worker_b.read_story_events()
+    assert [event['story_id'] for _, event in remaining] == [2], "Each entry is delivered to one consumer"
+
+
+def test_story_event_micro_batches():
+    """Test that stream events are grouped into size-bounded micro-batches."""
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_service = RedisService(redis_client=fakeredis.FakeRedis(), transport="streams")
+    redis_service.ensure_consumer_group()
+    for story_id in range(5):
+        redis_service.publish_story_event(story_id, {"id": story_id})
+    
+    batches = redis_service.story_event_batches(max_events=2, max_wait_ms=10)
+    sizes = [len(next(batches)) for _ in range(3)]
+    assert sizes == [2, 2, 1], f"Should flush on size, then on time, got {sizes}"
+    
+    pending = redis_service.redis_client.xpending(redis_service.stream, redis_service.group)
+    assert pending['pending'] == 1, "Only the batch still being handled should be unacked"
+
+
+@pytest.mark.asyncio
+async def test_cache_versioned_invalidation(monkeypatch):
+    """Test that a version bump from one worker invalidates entries for all."""
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(settings, "CACHE_LOCAL_TTL_SECONDS", 0)
+    server = fakeredis.FakeServer()
+    api_worker, writer = [
+        CacheService(
+            redis_client=fakeredis.FakeRedis(server=server),
+            async_redis_client=fakeredis.FakeAsyncRedis(server=server)
+        )
+        for _ in range(2)
+    ]
+    
+    key = await api_worker.key("dashboard")
+    await api_worker.set(key, {"total_stories": 1})
+    assert await writer.get(await writer.key("dashboard")) == {"total_stories": 1}, "Entries should be shared via Redis"
+    
+    writer.invalidate()
+    assert await api_worker.get(await api_worker.key("dashboard")) is None, "Bumped version should miss"
+    await api_worker.set(key, {"total_stories": 1})
+    assert await api_worker.get(await api_worker.key("dashboard")) is None, "A value stays under the version it was read at"
+
+
+def test_keyset_pagination(db_session, sample_story):
+    """Test that cursor pages cover every story exactly once, including score ties."""
+    crud.bulk_upsert_stories(db_session, [
+        dict(sample_story, id=story_id, score=score)
+        for story_id, score in [(1, 10), (2, 10), (3, 5), (4, 10), (5, 1)]
+    ])
+    
+    seen, cursor = [], None
+    while True:
+        page = crud.get_stories(db_session, limit=2, cursor=cursor)
+        seen.extend(story.id for story in page)
+        if len(page) < 2:
+            break
+        cursor = crud.encode_cursor(page[-1])
+    
+    assert seen == [4, 2, 1, 3, 5], f"Should page by (score, id) descending, got {seen}"
+    with pytest.raises(ValueError):
+        crud.decode_cursor("not-a-cursor")
+
+
+def test_story_filters_match_literally(db_session, sample_story):
+    """Test that LIKE wildcards in filter terms are matched literally."""
+    crud.bulk_upsert_stories(db_session, [
+        dict(sample_story, id=1, title="AI is 100% hype"),
+        dict(sample_story, id=2, title="AI is 1000 times faster"),
+    ])
+    
+    stories = crud.get_stories(db_session, keyword="100%")
+    assert [story.id for story in stories] == [1], "'%' should not act as a wildcard"
+
+
+def test_story_keyword_associations(db_session, sample_story):
+    """Test that analytics records per-story keywords used by the keyword filter."""
+    analytics_service = AnalyticsService()
+    crud.bulk_upsert_stories(db_session, [
+        dict(sample_story, id=1, title="Claude writes HTML"),
+        dict(sample_story, id=2, title="Why ML is hard"),
+    ])
+    analytics_service.process_stories(db_session, crud.get_stories_by_ids(db_session, [1, 2]))
+    
+    tracked = analytics_service.ai_keywords
+    stories = crud.get_stories(db_session, keyword="ML", tracked_keywords=tracked)
+    assert [story.id for story in stories] == [2], "Tracked keywords should use story_keywords"
+    assert crud.get_story(db_session, 1).domain == "openai.com", "Domain should be stored on the story"
+    
+    # Untracked terms fall back to a title substring search
+    stories = crud.get_stories(db_session, keyword="html", tracked_keywords=tracked)
+    assert [story.id for story in stories] == [1]
+
+
+def test_domain_filter_exact_match(db_session, sample_story):
+    """Test that the domain filter matches the stored domain exactly."""
+    crud.bulk_upsert_stories(db_session, [
+        dict(sample_story, id=1, url="https://x.com/status/1"),
+        dict(sample_story, id=2, url="https://www.netflix.com/title/2"),
+    ])
+    
+    stories = crud.get_stories(db_session, domain="X.com")
+    assert [story.id for story in stories] == [1], "'x.com' should not match 'netflix.com'"
+    assert crud.get_stories(db_session, domain="www.netflix.com")[0].domain == "netflix.com"
+
+
+def test_maintained_table_counts(db_session, sample_story):
+    """Test that row counts are maintained by the write paths instead of COUNT(*)."""
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1)])
+    assert crud.get_stories_count(db_session) == 1, "Unseeded counters should fall back to COUNT(*)"
+    assert crud.refresh_table_counts(db_session) == {"stories": 1, "analytics": 0, "domains": 0}
+    
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1), dict(sample_story, id=2)])
+    crud.increment_keyword_counts(db_session, {"ai": 1, "llm": 2}, datetime.now())
+    crud.increment_keyword_counts(db_session, {"ai": 1}, datetime.now())
+    db_session.commit()
+    assert crud.get_stories_count(db_session) == 2, "Only new stories should be counted"
+    assert crud.get_analytics_count(db_session) == 2, "Existing keywords should not be counted again"
+    
+    db_session.query(models.Story).filter(models.Story.id == 2).delete()
+    db_session.commit()
+    assert crud.get_stories_count(db_session) == 2
+    assert crud.get_stories_count(db_session, exact=True) == 1, "Exact mode should recount"
+    crud.refresh_table_counts(db_session)
+    assert crud.get_stories_count(db_session) == 1, "Refreshing should correct the counter"
+    
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=3)], commit=False)
+    crud.get_stories_count(db_session, exact=True)
+    db_session.rollback()
+    assert crud.get_story(db_session, 3) is None, "Reading a count should not commit the caller's work"
+
+
+def test_trending_buckets(db_session, sample_story):
+    """Test that hourly buckets drive window counts and the trending ranking."""
+    analytics_service = AnalyticsService()
+    now = datetime(2024, 5, 1, 12, 30)
+    hour_ago = now - timedelta(hours=1)
+    old = now - timedelta(days=3)
+    analytics_service.process_stories(db_session, [
+        dict(sample_story, id=1, title="LLM news", time=old),
+        dict(sample_story, id=2, title="LLM and AI", time=hour_ago),
+        dict(sample_story, id=3, title="AI again", time=hour_ago),
+        dict(sample_story, id=4, title="AI in the current hour", time=now),
+    ])
+    
+    since, until, baseline_since = analytics_service.trend_windows(1, now)
+    assert (since, until) == (datetime(2024, 5, 1, 11), datetime(2024, 5, 1, 12)), "Only complete hours count"
+    assert crud.get_trend_counts(db_session, "keyword", since, until=until) == [("ai", 2), ("llm", 1)]
+    
+    since, until, baseline_since = analytics_service.trend_windows(24, now)
+    assert crud.get_trend_counts(db_session, "keyword", since, until=until) == [("ai", 2), ("llm", 1)]
+    
+    rows = crud.get_trending_rows(db_session, "keyword", since, baseline_since, until)
+    ranked = analytics_service.rank_trending(rows, 24)
+    assert [item["term"] for item in ranked] == ["ai", "llm"], "New terms should outrank ones with history"
+    assert ranked[1]["expected"] > 0
+
+
+def test_daily_rollups(db_session, sample_story, monkeypatch):
+    """Test that daily rollups cover newly stored stories and are recomputed idempotently."""
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", -60)
+    analytics_service = AnalyticsService()
+    day = datetime(2024, 5, 1, 12)
+    stories = [
+        dict(sample_story, id=1, title="AI one", time=day, score=10, descendants=4),
+        dict(sample_story, id=2, title="AI two", time=day, score=20, descendants=6),
+    ]
+    crud.bulk_upsert_stories(db_session, stories)
+    analytics_service.process_stories(db_session, stories)
+    
+    assert analytics_service.update_daily_rollups(db_session)["days_updated"] == 1
+    assert analytics_service.update_daily_rollups(db_session)["days_updated"] == 0, "Watermark should skip seen rows"
+    
+    rollups = crud.get_daily_rollups(db_session, "keyword", day.date(), term="AI")
+    assert rollups == [{
+        "term": "ai", "day": day.date(), "story_count": 2, "avg_score": 15.0, "comment_total": 10
+    }]
+    assert crud.get_daily_rollups(db_session, "domain", day.date())[0]["story_count"] == 2
+
+
+def test_rebuild_analytics(db_session, sample_story):
+    """Test that a rebuild recomputes analytics from stored stories for the current keywords."""
+    analytics_service = AnalyticsService()
+    stories = [
+        dict(sample_story, id=1, title="LLM agents", url="https://a.com/1"),
+        dict(sample_story, id=2, title="Rust and LLM", url="https://b.com/2"),
+        dict(sample_story, id=3, title="Rust again", url="https://b.com/3"),
+    ]
+    crud.bulk_upsert_stories(db_session, stories)
+    analytics_service.process_stories(db_session, stories)
+    # Stored before the rebuild, still waiting for the processor
+    pending = [dict(sample_story, id=4, title="Rust pending", url="https://c.com/4")]
+    crud.bulk_upsert_stories(db_session, pending)
+    crud.set_sync_state(db_session, AnalyticsService.ROLLUP_STATE, 123)
+    
+    rebuilder = AnalyticsService(keywords={"rust"})
+    result = rebuilder.rebuild_analytics(db_session, batch_size=2, workers=2)
+    
+    assert result == {"stories": 4, "keywords": 1, "domains": 3}
+    assert [(a.keyword, a.count) for a in crud.get_analytics(db_session)] == [("rust", 3)]
+    assert crud.get_analytics_count(db_session) == 1, "Row counts should be refreshed"
+    assert crud.get_domains_count(db_session) == 3
+    assert [(d.domain, d.count) for d in crud.get_domains(db_session)] == [("b.com", 2), ("a.com", 1), ("c.com", 1)]
+    stories = crud.get_stories(db_session, keyword="rust", tracked_keywords={"rust"})
+    assert sorted(story.id for story in stories) == [2, 3, 4], "Story keywords should be rebuilt"
+    assert crud.get_sync_state(db_session, AnalyticsService.ROLLUP_STATE) == 123, "Rollups should not restart"
+    
+    assert rebuilder.process_stories(db_session, pending) == [], "Counted stories should not be counted again"
+    assert [(a.keyword, a.count) for a in crud.get_analytics(db_session)] == [("rust", 3)]
+
+
+def test_keyword_registry_hot_reload(db_session, sample_story):
+    """Test that keyword changes in the database reach a running service."""
+    analytics_service = AnalyticsService(registry=KeywordRegistry(refresh_seconds=0))
+    assert "llm" in analytics_service.keywords(db_session), "Config keywords apply while the table is empty"
+    
+    rust = crud.create_ai_keyword(db_session, "Rust")
+    story = dict(sample_story, id=1, title="Rust in prod")
+    crud.bulk_upsert_stories(db_session, [story])
+    analytics_service.process_stories(db_session, [story])
+    assert analytics_service.keywords(db_session) == {"rust"}
+    assert crud.get_analytics(db_session)[0].keyword == "rust", "New keywords should be matched"
+    
+    go = crud.create_ai_keyword(db_session, "Go")
+    crud.set_ai_keyword_status(db_session, rust.id, "inactive")
+    assert analytics_service.keywords(db_session) == {"go"}
+    matcher = analytics_service.matcher_for(db_session)
+    assert matcher.keywords == ["go"] and analytics_service.matcher_for(db_session) is matcher
+    
+    crud.set_ai_keyword_status(db_session, go.id, "inactive")
+    assert analytics_service.keywords(db_session) == set(), "Disabling every keyword tracks nothing"
+    assert analytics_service.extract_keywords("Go and Rust") == set()
+    
+    from sqlalchemy.exc import IntegrityError
+    with pytest.raises(IntegrityError):
+        crud.create_ai_keyword(db_session, "GO")
+    assert len(crud.get_ai_keywords(db_session)) == 2, "Keywords are unique regardless of case"
+
+
+def test_refresh_schedule_and_bulk_update(db_session, sample_story):
+    """Test that active stories are re-polled less often with age and updated in bulk."""
+    from backend.tasks.story_tasks import _stories_due_for_refresh
+    now = datetime.now()
+    crud.bulk_upsert_stories(db_session, [
+        dict(sample_story, id=1, time=now - timedelta(hours=1)),
+        dict(sample_story, id=2, time=now - timedelta(hours=40)),
+        dict(sample_story, id=3, time=now - timedelta(days=10)),
+    ])
+    crud.update_story_stats(db_session, {1: (100, 50), 2: (100, 50), 3: (100, 50)}, now - timedelta(minutes=30))
+    
+    candidates = crud.get_refresh_candidates(db_session, now - timedelta(hours=48), [3])
+    assert sorted(story.id for story in candidates) == [1, 2, 3]
+    assert sorted(_stories_due_for_refresh(candidates, {3}, now)) == [1, 3], "Old stories wait longer unless on the front page"
+    
+    crud.update_story_stats(db_session, {1: (150, 70), 3: (101, 50)}, now)
+    db_session.expire_all()
+    assert (crud.get_story(db_session, 1).score, crud.get_story(db_session, 1).descendants) == (150, 70)
+    assert crud.get_story(db_session, 2).score == 100, "Stories not polled keep their values"
+
+
+def test_score_history_snapshots(db_session, sample_story):
+    """Test that score history stores only changes and is downsampled with age."""
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1, score=10)])
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1, score=10)], update_existing=True)
+    assert [s.score for s in crud.get_story_trajectory(db_session, 1)] == [10], "Unchanged values are skipped"
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1, score=25)], update_existing=True)
+    assert crud.get_story_trajectory(db_session, 1)[-1].score == 25
+    
+    # Three changes within one old hour collapse to the last one
+    old = datetime(2024, 1, 1, 10)
+    for minute, score in ((5, 30), (20, 40), (50, 50)):
+        crud.update_story_stats(db_session, {1: (score, 50)}, old.replace(minute=minute))
+    removed = crud.downsample_story_snapshots(db_session, "hour", datetime(2024, 1, 2))
+    assert removed == 2
+    trajectory = crud.get_story_trajectory(db_session, 1, since=old)
+    assert [s.score for s in trajectory if s.captured_at < datetime(2024, 1, 2)] == [50]
+    assert trajectory[-1].score == 25
+
+
+@pytest.mark.asyncio
+async def test_comment_crawler_breadth_first(db_session, sample_story, monkeypatch):
+    """Test that comments are crawled level by level within the caps and stored with keywords."""
+    from backend.tasks.story_tasks import _store_comment_batch
+    items = {
+        1: {"id": 1, "type": "story", "kids": [10, 11, 12]},
+        10: {"id": 10, "type": "comment", "parent": 1, "text": "Claude &amp; <i>LLM</i>", "kids": [20, 21]},
+        11: {"id": 11, "type": "comment", "deleted": True, "kids": [22]},
+        12: {"id": 12, "type": "comment", "parent": 1, "text": "No mentions"},
+        20: {"id": 20, "type": "comment", "parent": 10, "text": "LLM again", "kids": [30]},
+        21: {"id": 21, "type": "comment", "parent": 10, "text": "ok"},
+        22: {"id": 22, "type": "comment", "parent": 11, "text": "reply to deleted"},
+        30: {"id": 30, "type": "comment", "parent": 20, "text": "too deep"},
+    }
+    
+    async def get_item(story_id):
+        return dict(items[story_id])
+    
+    hn_service = HackerNewsService(max_concurrency=2)
+    monkeypatch.setattr(hn_service, "get_story", get_item)
+    comments = [c async for c in hn_service.crawl_comments(1, max_depth=2, max_per_depth=2, max_comments=100)]
+    
+    # Two items per level: 12 and the reply to deleted 11 fall outside the cap, 30 is too deep
+    assert [(c["id"], c["depth"]) for c in comments] == [(10, 1), (20, 2), (21, 2)]
+    
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1)])
+    analytics_service = AnalyticsService()
+    assert _store_comment_batch(db_session, analytics_service, 1, comments) == len(comments)
+    assert _store_comment_batch(db_session, analytics_service, 1, comments) == 0, "Known comments are skipped"
+    counts = {k.keyword: k.count for k in crud.get_story_comment_keywords(db_session, 1)}
+    assert counts == {"claude": 1, "llm": 2}
+
+
+@pytest.mark.asyncio
+async def test_multi_feed_fetch_dedup(db_session, sample_story, monkeypatch):
+    """Test that overlapping feeds fetch each unknown item once and record their ranks."""
+    from backend.tasks.story_tasks import _fetch_new_feed_stories
+    feeds = {"top": [1, 2, 3], "new": [4, 3], "job": [5, 1]}
+    fetched = []
+    
+    async def get_feed(feed):
+        if feed == "ask":
+            raise RuntimeError("feed unavailable")
+        return feeds[feed]
+    
+    async def get_item(item_id):
+        fetched.append(item_id)
+        return dict(sample_story, id=item_id, time=1700000000, type="job" if item_id == 5 else "story")
+    
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1)])
+    hn_service = HackerNewsService()
+    monkeypatch.setattr(hn_service, "get_feed", get_feed)
+    monkeypatch.setattr(hn_service, "get_story", get_item)
+    feed_ids, story_ids, stories = await _fetch_new_feed_stories(hn_service, db_session, ["top", "new", "job", "ask"])
+    
+    assert set(feed_ids) == {"top", "new", "job"}, "A failing feed is left out"
+    assert story_ids == {1, 2, 3, 4, 5}
+    assert sorted(fetched) == [2, 3, 4, 5], "Each unknown item is fetched once"
+    assert sorted(story["id"] for story in stories) == [2, 3, 4, 5]
+    
+    crud.bulk_upsert_stories(db_session, stories)
+    assert crud.replace_feed_memberships(db_session, feed_ids, datetime.now()) == 7
+    assert [s.id for s in crud.get_feed_stories(db_session, "new")] == [4, 3]
+    
+    crud.replace_feed_memberships(db_session, {"new": [3]}, datetime.now())
+    assert [s.id for s in crud.get_feed_stories(db_session, "new")] == [3], "A feed's listing is replaced"
+    assert [s.id for s in crud.get_feed_stories(db_session, "top")] == [1, 2, 3], "Other feeds are kept"
+    
+    analytics_service = AnalyticsService(keywords={"chatgpt"})
+    assert [r["story_id"] for r in analytics_service.process_stories(db_session, stories)] == [2, 3, 4]
+    assert crud.get_analytics(db_session)[0].count == 3, "Job posts are kept out of analytics"
+    assert analytics_service.rebuild_analytics(db_session)["stories"] == 4
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_checkpoint(db_session, sample_story, monkeypatch):
+    """Test that the backfill walks shards downward in chunks and resumes after a failure."""
+    from backend.services.backfill_service import BackfillFetchError, BackfillService
+    fetched = []
+    
+    async def get_max_item():
+        return 10
+    
+    async def get_item(item_id):
+        fetched.append(item_id)
+        return dict(sample_story, id=item_id, time=1700000000, type="story" if item_id % 2 else "comment")
+    
+    service = BackfillService(HackerNewsService(), chunk_size=3)
+    monkeypatch.setattr(service.hn_service, "get_max_item", get_max_item)
+    monkeypatch.setattr(service.hn_service, "get_story", get_item)
+    assert await service.start(db_session, shards=2)
+    assert not await service.start(db_session, shards=2), "A stored plan is resumed, not replaced"
+    assert service.remaining(db_session) == [(0, 10, 6), (1, 5, 1)]
+    
+    progress = await service.run(db_session, max_chunks=1)
+    assert (progress.items, progress.stories) == (6, 3)
+    assert service.remaining(db_session) == [(0, 7, 6), (1, 2, 1)]
+    
+    # A failing write leaves the shard's checkpoint where it was
+    monkeypatch.setattr(service.analytics_service, "process_stories", lambda *args: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        await service.run(db_session, shards=[0])
+    assert service.remaining(db_session) == [(0, 7, 6), (1, 2, 1)]
+    
+    monkeypatch.undo()
+    monkeypatch.setattr(service.hn_service, "get_story", get_item)
+    fetched.clear()
+    await service.run(db_session)
+    assert sorted(fetched) == [1, 2, 6, 7], "Only the IDs past the checkpoints are fetched"
+    assert service.remaining(db_session) == []
+    assert sorted(s.id for s in crud.get_stories(db_session)) == [1, 3, 5, 7, 9], "Only stories are stored"
+    
+    monkeypatch.setattr(service.hn_service, "get_max_item", get_max_item)
+    assert await service.start(db_session, shards=1, min_item=8, restart=True)
+    assert service.remaining(db_session) == [(0, 10, 8)]
+    
+    # A shard stops at the highest item it could not fetch and resumes there
+    async def get_item_failing(item_id):
+        if item_id == 9:
+            raise httpx.ConnectError("connection reset")
+        return await get_item(item_id)
+    
+    monkeypatch.setattr(service.hn_service, "get_story", get_item_failing)
+    with pytest.raises(BackfillFetchError):
+        await service.run(db_session)
+    assert service.remaining(db_session) == [(0, 9, 8)]
+    
+    monkeypatch.setattr(service.hn_service, "get_story", get_item)
+    fetched.clear()
+    await service.run(db_session)
+    assert sorted(fetched) == [8, 9]
+    assert service.remaining(db_session) == []
+
+
+def test_processor_skips_analyzed_stories_and_surfaces_failures(db_session, sample_story, monkeypatch):
+    """Test that redelivered events are not counted twice and failed batches are not swallowed."""
+    from backend.workers import background_processor
+    crud.bulk_upsert_stories(db_session, [sample_story])
+    monkeypatch.setattr(background_processor, "SessionLocal", lambda: db_session)
+    processor = background_processor.BackgroundProcessor()
+    processor.cache_service.enabled = False
+    event = {"story_id": 12345, "story_data": {"id": 12345}}
+    
+    processor.process_story_events([event, event])
+    processor.process_story_events([event])
+    counts = {a.keyword: a.count for a in crud.get_analytics(db_session)}
+    assert counts["claude"] == 1, "A redelivered story should not be counted again"
+    
+    monkeypatch.setattr(processor.analytics_service, "process_stories", lambda *args: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        processor.process_story_events([event])
+
+
+def test_failed_story_event_batches_stay_pending():
+    """Test that a batch the consumer rejects is not acknowledged."""
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_service = RedisService(redis_client=fakeredis.FakeRedis(), transport="streams")
+    redis_service.ensure_consumer_group()
+    for story_id in range(3):
+        redis_service.publish_story_event(story_id, {"id": story_id})
+    
+    batches = redis_service.story_event_batches(max_events=2, max_wait_ms=10)
+    next(batches)
+    batches.send(False)
+    pending = redis_service.redis_client.xpending(redis_service.stream, redis_service.group)
+    assert pending['pending'] == 3, "The failed batch should stay pending with the one in flight"
+
+
+def test_story_event_batches_default_to_processor_batch_size(monkeypatch):
+    """Test that micro-batches flush at PROCESSOR_BATCH_SIZE, not the stream read size."""
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(settings, "PROCESSOR_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "REDIS_STREAM_BATCH_SIZE", 100)
+    redis_service = RedisService(redis_client=fakeredis.FakeRedis(), transport="streams")
+    for story_id in range(3):
+        redis_service.publish_story_event(story_id, {"id": story_id})
+    
+    batches = redis_service.story_event_batches(max_wait_ms=10)
+    assert len(next(batches)) == 2
+
+
+def test_daily_rollups_revisit_late_analyzed_days(db_session, sample_story, monkeypatch):
+    """Test that a day rolled up before its stories were analyzed is revisited once they are."""
+    from datetime import timezone
+    from sqlalchemy import func, select, update
+    monkeypatch.setattr(settings, "ROLLUP_LAG_SECONDS", 0)
+    analytics_service = AnalyticsService()
+    day = datetime(2024, 5, 1, 12)
+    stories = [dict(sample_story, id=1, title="AI one", time=day)]
+    crud.bulk_upsert_stories(db_session, stories)
+    db_session.execute(update(models.Story).values(fetched_at=day))
+    db_session.commit()
+    
+    assert analytics_service.update_daily_rollups(db_session)["days_updated"] == 1
+    assert crud.get_daily_rollups(db_session, "keyword", day.date(), term="AI") == []
+    # Rewind the watermark a little so each run below sees what changed in the last seconds
+    now = db_session.scalar(select(func.now())).replace(tzinfo=timezone.utc)
+    crud.set_sync_state(db_session, AnalyticsService.ROLLUP_STATE, int(now.timestamp()) - 30)
+    assert analytics_service.update_daily_rollups(db_session)["days_updated"] == 0
+    
+    crud.set_sync_state(db_session, AnalyticsService.ROLLUP_STATE, int(now.timestamp()) - 30)
+    analytics_service.process_stories(db_session, stories)
+    assert analytics_service.update_daily_rollups(db_session)["days_updated"] == 1
+    assert crud.get_daily_rollups(db_session, "keyword", day.date(), term="AI")[0]["story_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_incremental_fetch_stops_below_failed_items(sample_story, monkeypatch):
+    """Test that the incremental high-water mark never passes a new item whose fetch failed."""
+    from backend.tasks.story_tasks import _fetch_incremental_items
+    
+    async def get_max_item():
+        return 20
+    
+    async def get_updates():
+        return [3, 15]
+    
+    async def get_item(item_id):
+        if item_id in (3, 14, 17):
+            raise httpx.ConnectError("connection reset")
+        return dict(sample_story, id=item_id, time=1700000000)
+    
+    hn_service = HackerNewsService()
+    monkeypatch.setattr(hn_service, "get_max_item", get_max_item)
+    monkeypatch.setattr(hn_service, "get_updates", get_updates)
+    monkeypatch.setattr(hn_service, "get_story", get_item)
+    stories, _, high_water_mark, failed_ids = await _fetch_incremental_items(hn_service, 10)
+    
+    assert sorted(failed_ids) == [3, 14, 17]
+    assert high_water_mark == 13, "The mark stays below the lowest failed new item"
+    assert sorted(story["id"] for story in stories) == [11, 12, 13, 15, 16, 18, 19, 20]
+    
+    async def get_live_item(item_id):
+        return dict(sample_story, id=item_id, time=1700000000)
+    
+    monkeypatch.setattr(hn_service, "get_story", get_live_item)
+    assert (await _fetch_incremental_items(hn_service, 10))[2:] == (20, []), "Without failures the mark reaches maxitem"
+
+
+def test_daily_snapshot_downsampling_resumes_from_watermark(db_session, sample_story, monkeypatch):
+    """Test that the daily score history pass only rescans from the day it last stopped in."""
+    from backend.tasks.story_tasks import SNAPSHOT_DAILY_STATE, _downsample_snapshots
+    calls = []
+    downsample = crud.downsample_story_snapshots
+    
+    def record(db, unit, before, after=None):
+        calls.append((unit, before, after))
+        return downsample(db, unit, before, after)
+    
+    monkeypatch.setattr(crud, "downsample_story_snapshots", record)
+    crud.bulk_upsert_stories(db_session, [dict(sample_story, id=1)])
+    for hour, score in ((9, 30), (15, 40)):
+        crud.update_story_stats(db_session, {1: (score, 50)}, datetime(2024, 1, 1, hour))
+    
+    now = datetime(2024, 1, 20, 6)
+    assert _downsample_snapshots(db_session, now) == 1
+    assert calls[-1] == ("day", datetime(2024, 1, 13, 6), None), "The first run has no lower bound"
+    assert crud.get_sync_state(db_session, SNAPSHOT_DAILY_STATE) is not None
+    
+    _downsample_snapshots(db_session, now + timedelta(days=1))
+    assert calls[-1] == ("day", datetime(2024, 1, 14, 6), datetime(2024, 1, 13)), "Later runs start at the last day"
+
+
+@pytest.mark.asyncio
+async def test_hn_client_is_pooled_and_concurrency_capped(sample_story, monkeypatch):
+    """Test that item requests share one client and never exceed the concurrency cap."""
+    import asyncio
+    in_flight, peak, clients = 0, 0, []
+    
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        item_id = int(request.url.path.rsplit("/", 1)[-1].split(".")[0])
+        return httpx.Response(200, json=dict(sample_story, id=item_id))
+    
+    real_client = httpx.AsyncClient
+    
+    def client_factory(**kwargs):
+        clients.append(real_client(transport=httpx.MockTransport(handler), **kwargs))
+        return clients[-1]
+    
+    monkeypatch.setattr(httpx, "AsyncClient", client_factory)
+    hn_service = HackerNewsService(max_concurrency=3)
+    async with hn_service:
+        first = await hn_service.get_stories(list(range(1, 11)))
+        second = await hn_service.get_stories(list(range(11, 16)))
+    
+    assert sorted(s["id"] for s in first + second) == list(range(1, 16))
+    assert peak == 3, "Requests in flight should be capped by max_concurrency"
+    assert len(clients) == 1, "Calls should reuse one pooled client"
+    assert clients[0].is_closed, "Leaving the context should close the client"
+
+
+@pytest.mark.asyncio
+async def test_async_session_reads(tmp_path, sample_story):
+    """Test that the async CRUD path reads through an aiosqlite session."""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend.database import async_crud
+    from backend.database.database import get_async_database_url
+    
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        crud.bulk_upsert_stories(db, [dict(sample_story, id=1, score=5), dict(sample_story, id=2, score=9)])
+        crud.increment_keyword_counts(db, {"ai": 2}, datetime.now())
+        db.commit()
+    engine.dispose()
+    
+    assert get_async_database_url(url).startswith("sqlite+aiosqlite:///")
+    async_engine = create_async_engine(get_async_database_url(url))
+    try:
+        async with async_sessionmaker(async_engine, expire_on_commit=False)() as db:
+            assert [s.id for s in await async_crud.get_stories(db, limit=10)] == [2, 1]
+            assert (await async_crud.get_story(db, 1)).score == 5
+            assert await async_crud.get_stories_count(db) == 2
+            assert [(a.keyword, a.count) for a in await async_crud.get_analytics(db)] == [("ai", 2)]
+            db_now = await async_crud.get_db_now(db)
+            assert abs(db_now - utcnow()) < timedelta(minutes=1), "The database clock reads as naive UTC"
+    finally:
+        await async_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_process_story_route_is_idempotent(client, db_session, sample_story):
+    """Test that processing the same story twice reports it instead of failing."""
+    crud.bulk_upsert_stories(db_session, [sample_story])
+    app.dependency_overrides[get_db] = lambda: db_session
+    try:
+        first = await client.post(f"/api/v1/process-story/{sample_story['id']}")
+        second = await client.post(f"/api/v1/process-story/{sample_story['id']}")
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert first.status_code == 200 and 'chatgpt' in first.json()['keywords_found']
+    assert second.status_code == 200, "A repeated call should not fail"
+    assert second.json()['already_analyzed'] is True
+    counts = {a.keyword: a.count for a in crud.get_analytics(db_session)}
+    assert counts['chatgpt'] == 1, "Counts should be applied once"
+
+
+def test_incremental_mark_stays_below_unstored_batches(db_session, sample_story, monkeypatch):
+    """Test that new items of a batch that failed to store are fetched again next run."""
+    from backend.tasks import story_tasks
+    stories = [dict(sample_story, id=item_id) for item_id in range(11, 21)]
+    
+    async def fetch_items(hn_service, since_max_item):
+        return stories, list(range(11, 21)), 20, []
+    
+    upsert = crud.bulk_upsert_stories
+    
+    def flaky_upsert(db, batch, **kwargs):
+        if any(story["id"] == 16 for story in batch):
+            raise RuntimeError("database is locked")
+        return upsert(db, batch, **kwargs)
+    
+    monkeypatch.setattr(story_tasks, "_fetch_incremental_items", fetch_items)
+    monkeypatch.setattr(story_tasks, "SessionLocal", lambda: db_session)
+    monkeypatch.setattr(story_tasks.fetch_incremental_stories, "update_state", lambda **kwargs: None)
+    monkeypatch.setattr(crud, "bulk_upsert_stories", flaky_upsert)
+    monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 4)
+    result = story_tasks.fetch_incremental_stories.run()
+    
+    assert (result["new_count"], result["unstored_count"]) == (6, 4)
+    assert result["max_item"] == 14, "The mark stays below the first batch that was not stored"
+    assert crud.get_sync_state(db_session, story_tasks.MAX_ITEM_STATE) == 14
+
+
+@pytest.mark.asyncio
+async def test_blank_ai_keyword_is_rejected(client, db_session):
+    """Test that a whitespace-only keyword fails validation instead of being stored."""
+    app.dependency_overrides[get_db] = lambda: db_session
+    try:
+        blank = await client.post("/api/v1/ai-keywords", json={"keyword": "   "})
+        padded = await client.post("/api/v1/ai-keywords", json={"keyword": "  Rust "})
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert blank.status_code == 422
+    assert padded.status_code == 201 and padded.json()["keyword"] == "Rust", "Keywords are stored stripped"
+    assert [k.keyword for k in crud.get_ai_keywords(db_session)] == ["Rust"]
+
+
+def test_create_story_stores_domain(db_session, sample_story):
+    """Test that the schema-based insert path stores the normalized domain too."""
+    from backend.schemas import StoryCreate
+    fields = {key: sample_story[key] for key in ("id", "title", "url", "score", "descendants")}
+    story = crud.create_story(db_session, StoryCreate(**fields, time=datetime(2024, 1, 1)))
+    assert story.domain == "openai.com"
+    assert [s.id for s in crud.get_stories(db_session, domain="openai.com")] == [sample_story["id"]] 
\ No newline at end of file